@@ -0,0 +1,79 @@
+"""add stats materialized views
+
+Revision ID: 3f9d7b2c5e14
+Revises: 8c4e2a6f1b3d
+Create Date: 2026-10-19 12:26:05.117420
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9d7b2c5e14'
+down_revision: Union[str, None] = '8c4e2a6f1b3d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Every view needs a unique index: REFRESH ... CONCURRENTLY diffs the old
+    # and new contents by it, which is what lets readers keep going during a refresh.
+    op.execute("""
+        CREATE MATERIALIZED VIEW mv_contacts_per_user AS
+        SELECT u.id AS user_id, u.username, u.email,
+               count(c.id) AS contacts, max(c.created_at) AS last_contact_at
+        FROM users u LEFT JOIN contacts c ON c.user_id = u.id
+        GROUP BY u.id, u.username, u.email
+    """)
+    op.execute("CREATE UNIQUE INDEX ux_mv_contacts_per_user ON mv_contacts_per_user (user_id)")
+    op.execute("CREATE INDEX ix_mv_contacts_per_user_contacts ON mv_contacts_per_user (contacts DESC)")
+
+    op.execute("""
+        CREATE MATERIALIZED VIEW mv_signups_per_day AS
+        SELECT created_at::date AS day, count(*) AS signups,
+               count(*) FILTER (WHERE confirmed) AS confirmed
+        FROM users
+        WHERE created_at IS NOT NULL
+        GROUP BY created_at::date
+    """)
+    op.execute("CREATE UNIQUE INDEX ux_mv_signups_per_day ON mv_signups_per_day (day)")
+
+    # Next birthday = birth date moved to this year or next; a birthday today
+    # counts as 0 days away, and Feb 29 falls on Feb 28 in common years.
+    op.execute("""
+        CREATE MATERIALIZED VIEW mv_upcoming_birthdays AS
+        SELECT user_id,
+               count(*) FILTER (WHERE days_until < 7) AS next_7_days,
+               count(*) FILTER (WHERE days_until < 30) AS next_30_days
+        FROM (
+            SELECT user_id,
+                   (birthday + (date_part('year', age(current_date - 1, birthday)) + 1) * interval '1 year')::date
+                       - current_date AS days_until
+            FROM contacts
+            WHERE birthday <= current_date
+        ) upcoming
+        GROUP BY user_id
+    """)
+    op.execute("CREATE UNIQUE INDEX ux_mv_upcoming_birthdays ON mv_upcoming_birthdays (user_id)")
+
+    op.create_table('materialized_view_refreshes',
+    sa.Column('view_name', sa.String(length=63), nullable=False),
+    sa.Column('refreshed_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('duration_ms', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('view_name')
+    )
+    op.execute("""
+        INSERT INTO materialized_view_refreshes (view_name, refreshed_at, duration_ms)
+        VALUES ('mv_contacts_per_user', now(), 0), ('mv_signups_per_day', now(), 0),
+               ('mv_upcoming_birthdays', now(), 0)
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('materialized_view_refreshes')
+    op.execute("DROP MATERIALIZED VIEW mv_upcoming_birthdays")
+    op.execute("DROP MATERIALIZED VIEW mv_signups_per_day")
+    op.execute("DROP MATERIALIZED VIEW mv_contacts_per_user")
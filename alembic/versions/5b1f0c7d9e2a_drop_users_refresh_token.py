@@ -0,0 +1,27 @@
+"""drop users refresh_token
+
+Revision ID: 5b1f0c7d9e2a
+Revises: d2f459818814
+Create Date: 2026-10-19 10:12:41.503118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b1f0c7d9e2a'
+down_revision: Union[str, None] = 'd2f459818814'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Refresh tokens now live in Redis (src/services/refresh_tokens.py).
+    op.drop_column('users', 'refresh_token')
+
+
+def downgrade() -> None:
+    op.add_column('users', sa.Column('refresh_token', sa.String(), nullable=True))
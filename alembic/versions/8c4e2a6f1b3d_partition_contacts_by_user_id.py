@@ -0,0 +1,99 @@
+"""partition contacts by user_id
+
+Revision ID: 8c4e2a6f1b3d
+Revises: 5b1f0c7d9e2a
+Create Date: 2026-10-19 11:03:27.918342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c4e2a6f1b3d'
+down_revision: Union[str, None] = '5b1f0c7d9e2a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PARTITIONS = 16
+COLUMNS = "id, first_name, last_name, email, phone, birthday, additional_info, created_at, updated_at, user_id"
+INDEXES = [
+    ("ix_contacts_user_id_id", "", "(user_id, id)"),
+    ("uq_contacts_user_id_email", "UNIQUE", "(user_id, email)"),
+    ("ix_contacts_first_name", "", "(first_name)"),
+    ("ix_contacts_last_name", "", "(last_name)"),
+    ("ix_contacts_phone", "", "(phone)"),
+]
+
+
+def upgrade() -> None:
+    # This copies the table inside the migration transaction and blocks writes
+    # until it commits. For large tables run `python -m src.database.partition_contacts all`
+    # first; it converts the table online and this migration becomes a no-op.
+    bind = op.get_bind()
+    relkind = bind.execute(sa.text("SELECT relkind FROM pg_class WHERE oid = 'contacts'::regclass")).scalar()
+    if relkind == 'p':
+        return
+    orphans = bind.execute(sa.text("SELECT count(*) FROM contacts WHERE user_id IS NULL")).scalar()
+    if orphans:
+        raise RuntimeError(f"{orphans} contacts have no user_id; assign or delete them before partitioning")
+
+    op.execute("""
+        CREATE TABLE contacts_partitioned (
+            id integer NOT NULL DEFAULT nextval('contacts_id_seq'),
+            first_name varchar(50) NOT NULL,
+            last_name varchar(50) NOT NULL,
+            email varchar(50) NOT NULL,
+            phone varchar(50) NOT NULL,
+            birthday date NOT NULL,
+            additional_info varchar,
+            created_at timestamp,
+            updated_at timestamp,
+            user_id integer NOT NULL
+        ) PARTITION BY HASH (user_id)
+    """)
+    for remainder in range(PARTITIONS):
+        op.execute(f"CREATE TABLE contacts_p{remainder:02d} PARTITION OF contacts_partitioned "
+                   f"FOR VALUES WITH (MODULUS {PARTITIONS}, REMAINDER {remainder})")
+    op.execute(f"INSERT INTO contacts_partitioned ({COLUMNS}) SELECT {COLUMNS} FROM contacts")
+
+    op.execute("ALTER SEQUENCE contacts_id_seq OWNED BY NONE")
+    op.execute("DROP TABLE contacts")
+    op.execute("ALTER TABLE contacts_partitioned RENAME TO contacts")
+    op.execute("ALTER SEQUENCE contacts_id_seq OWNED BY contacts.id")
+    # Indexes are built after the copy, which is much faster than maintaining them row by row.
+    op.execute("ALTER TABLE contacts ADD CONSTRAINT contacts_pkey PRIMARY KEY (id, user_id)")
+    op.execute("ALTER TABLE contacts ADD CONSTRAINT contacts_user_id_fkey FOREIGN KEY (user_id) REFERENCES users (id)")
+    for name, unique, columns in INDEXES:
+        op.execute(f"CREATE {unique} INDEX {name} ON contacts {columns}")
+    op.execute("ANALYZE contacts")
+
+
+def downgrade() -> None:
+    op.create_table('contacts_plain',
+    sa.Column('id', sa.Integer(), server_default=sa.text("nextval('contacts_id_seq')"), nullable=False),
+    sa.Column('first_name', sa.String(length=50), nullable=False),
+    sa.Column('last_name', sa.String(length=50), nullable=False),
+    sa.Column('email', sa.String(length=50), nullable=False),
+    sa.Column('phone', sa.String(length=50), nullable=False),
+    sa.Column('birthday', sa.Date(), nullable=False),
+    sa.Column('additional_info', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    )
+    op.execute(f"INSERT INTO contacts_plain ({COLUMNS}) SELECT {COLUMNS} FROM contacts")
+    op.execute("ALTER SEQUENCE contacts_id_seq OWNED BY NONE")
+    op.execute("DROP TABLE contacts CASCADE")
+    op.rename_table('contacts_plain', 'contacts')
+    op.execute("ALTER SEQUENCE contacts_id_seq OWNED BY contacts.id")
+    op.create_primary_key('contacts_pkey', 'contacts', ['id'])
+    op.create_foreign_key('contacts_user_id_fkey', 'contacts', 'users', ['user_id'], ['id'])
+    # Fails if two users now hold a contact with the same email.
+    op.create_index(op.f('ix_contacts_email'), 'contacts', ['email'], unique=True)
+    op.create_index(op.f('ix_contacts_first_name'), 'contacts', ['first_name'], unique=False)
+    op.create_index(op.f('ix_contacts_id'), 'contacts', ['id'], unique=False)
+    op.create_index(op.f('ix_contacts_last_name'), 'contacts', ['last_name'], unique=False)
+    op.create_index(op.f('ix_contacts_phone'), 'contacts', ['phone'], unique=False)
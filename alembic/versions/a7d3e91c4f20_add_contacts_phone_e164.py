@@ -0,0 +1,59 @@
+"""add contacts phone_e164
+
+Revision ID: a7d3e91c4f20
+Revises: 3f9d7b2c5e14
+Create Date: 2026-10-19 13:41:52.604118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.services.phones import to_e164
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d3e91c4f20'
+down_revision: Union[str, None] = '3f9d7b2c5e14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 5000
+
+
+def upgrade() -> None:
+    op.add_column('contacts', sa.Column('phone_e164', sa.String(length=16), nullable=True))
+
+    # Parsing happens in Python, so rows go out and come back in keyset
+    # batches. Each batch commits on its own: a long backfill holds no locks
+    # beyond the rows it is updating and can be resumed after a failure.
+    bind = op.get_bind()
+    select_batch = sa.text("SELECT id, user_id, phone FROM contacts "
+                           "WHERE id > :last_id AND phone_e164 IS NULL ORDER BY id LIMIT :limit")
+    update_batch = sa.text("""
+        UPDATE contacts c SET phone_e164 = v.phone_e164
+        FROM unnest(CAST(:ids AS integer[]), CAST(:user_ids AS integer[]), CAST(:phones AS varchar[]))
+            AS v(id, user_id, phone_e164)
+        WHERE c.id = v.id AND c.user_id = v.user_id
+    """)
+    with op.get_context().autocommit_block():
+        last_id = 0
+        while True:
+            rows = bind.execute(select_batch, {"last_id": last_id, "limit": BATCH_SIZE}).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            parsed = [(row.id, row.user_id, to_e164(row.phone)) for row in rows]
+            parsed = [row for row in parsed if row[2] is not None]
+            if parsed:
+                ids, user_ids, phones = zip(*parsed)
+                bind.execute(update_batch, {"ids": list(ids), "user_ids": list(user_ids), "phones": list(phones)})
+
+    # Built after the backfill rather than maintained through it.
+    op.create_index('ix_contacts_user_id_phone_e164', 'contacts', ['user_id', 'phone_e164'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_user_id_phone_e164', table_name='contacts')
+    op.drop_column('contacts', 'phone_e164')
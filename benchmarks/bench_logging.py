@@ -0,0 +1,51 @@
+# Caller-side cost of one access-log record: a plain synchronous JSON
+# handler on stdout versus the queue handler the app uses, where
+# formatting, redaction and the write happen on the listener thread.
+#
+#   python -m benchmarks.bench_logging [--count 100000] > /dev/null
+#
+# End-to-end overhead is measured with the load suite: run
+# benchmarks.load_test once with LOG_LEVEL=WARNING and once with the
+# default INFO, then `load_test compare` the two reports.
+import argparse
+import logging
+import sys
+import time
+
+from src.config.logging_config import JsonFormatter, RequestIdFilter, request_id, setup_logging
+
+EXTRA = {"method": "GET", "route": "/api/contacts", "path": "/api/contacts", "status": 200, "elapsed_ms": 3.2,
+         "client": "127.0.0.1", "authorization": "Bearer abc.def.ghi"}
+
+
+def bench(logger: logging.Logger, count: int) -> float:
+    started = time.perf_counter()
+    for _ in range(count):
+        logger.info("request", extra=EXTRA)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Logging overhead benchmark")
+    parser.add_argument("--count", type=int, default=100_000)
+    args = parser.parse_args()
+    request_id.set("bench")
+
+    sync_logger = logging.getLogger("bench.sync")
+    sync_logger.propagate = False
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter())
+    handler.addFilter(RequestIdFilter())
+    sync_logger.addHandler(handler)
+    sync_logger.setLevel(logging.INFO)
+
+    setup_logging()
+    queued_logger = logging.getLogger("bench.queued")
+
+    for name, logger in (("sync", sync_logger), ("queued", queued_logger)):
+        elapsed = bench(logger, args.count)
+        print(f"{name:7} {elapsed / args.count * 1e6:8.2f} us/record in the caller", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# Per-user contact query latency and partition pruning on a large table.
+#
+#   BENCH_DATABASE_URL=postgresql+asyncpg://... \
+#       python -m benchmarks.bench_partitions --contacts 10000000 --users 100000 --reset
+#   python -m benchmarks.bench_partitions --output heap.json        # before partitioning
+#   python -m benchmarks.bench_partitions --compare heap.json       # after
+#
+# Each method is called once for each of --samples random users, so every
+# call touches a different slice of the table as real traffic does. The
+# EXPLAIN of the first call lists the contacts relations it scans: with
+# pruning working a per-user query reads exactly one partition, and anything
+# more is flagged. --reset TRUNCATEs users and contacts.
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from benchmarks.bench_repository import QueryLog, explain
+from src.database.models import User
+from src.database.seeds import load
+from src.repository.contacts import ContactDB
+
+METHODS = {
+    "get_contacts": lambda db, user: db.get_contacts(0, 50, user),
+    "get_contacts[filtered]": lambda db, user: db.get_contacts(0, 50, user, last_name="ко"),
+    "get_contacts_birthday": lambda db, user: db.get_contacts_birthday(30, user),
+    "get_contacts_by_user": lambda db, user: db.get_contacts_by_user(user),
+}
+
+
+async def reset(database_url: str, users: int, contacts: int, workers: int):
+    engine = create_async_engine(database_url)
+    async with engine.begin() as connection:
+        await connection.execute(text("TRUNCATE contacts, users RESTART IDENTITY CASCADE"))
+    await engine.dispose()
+    await load(users=users, contacts=contacts, seed=42, workers=workers, chunk_size=100_000,
+               password="secret1", database_url=database_url)
+    engine = create_async_engine(database_url)
+    async with engine.begin() as connection:
+        await connection.execute(text("ANALYZE users, contacts"))
+    await engine.dispose()
+
+
+async def run(args) -> dict:
+    engine = create_async_engine(args.database_url)
+    sessions = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    log = QueryLog()
+    log.attach(engine)
+    try:
+        async with sessions() as session:
+            total = (await session.execute(text("SELECT count(*) FROM contacts"))).scalar()
+            partitioned = (await session.execute(text(
+                "SELECT relkind = 'p' FROM pg_class WHERE oid = 'contacts'::regclass"))).scalar()
+            ids = (await session.execute(text("SELECT id FROM users"))).scalars().all()
+            sample = random.Random(42).sample(ids, min(args.samples, len(ids)))
+            users = (await session.execute(select(User).where(User.id.in_(sample)))).scalars().all()
+        print(f"{total} contacts, {'partitioned' if partitioned else 'plain heap'}, {len(users)} sampled users")
+
+        results = {}
+        for name, call in METHODS.items():
+            timings, rows, scanned = [], [], []
+            for i, user in enumerate(users):
+                async with sessions() as session:
+                    with log.capture() as captured:
+                        started = time.perf_counter()
+                        found = await call(ContactDB(session), user)
+                        timings.append(time.perf_counter() - started)
+                    rows.append(len(found))
+                    if i == 0:
+                        plans = await explain(session, captured.statements)
+                        scanned = sorted({scan.split(" on ", 1)[1].split(" ", 1)[0]
+                                          for plan in plans for scan in plan["scans"]
+                                          if " on contacts" in scan})
+            timings.sort()
+            to_ms = lambda seconds: round(seconds * 1000, 3)
+            results[name] = {"p50_ms": to_ms(timings[len(timings) // 2]),
+                             "p95_ms": to_ms(timings[min(len(timings) - 1, int(len(timings) * 0.95))]),
+                             "mean_ms": to_ms(statistics.fmean(timings)),
+                             "rows_mean": round(statistics.fmean(rows), 1),
+                             "relations_scanned": scanned}
+            flag = "" if len(scanned) <= 1 else "  NOT PRUNED"
+            print(f"  {name:24} p50 {results[name]['p50_ms']:8.3f} ms  p95 {results[name]['p95_ms']:8.3f} ms  "
+                  f"scans {', '.join(scanned)}{flag}")
+    finally:
+        await engine.dispose()
+    return {"meta": {"started_at": datetime.now(timezone.utc).isoformat(), "contacts": total,
+                     "partitioned": partitioned, "samples": len(users)},
+            "methods": results}
+
+
+def compare(baseline: dict, current: dict):
+    print(f"{'':24} {'before p50':>12} {'after p50':>12} {'before p95':>12} {'after p95':>12}")
+    for name, new in current["methods"].items():
+        old = baseline["methods"].get(name)
+        if old is None:
+            continue
+        print(f"{name:24} {old['p50_ms']:12.3f} {new['p50_ms']:12.3f} {old['p95_ms']:12.3f} {new['p95_ms']:12.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-user contacts latency and partition pruning")
+    parser.add_argument("--database-url", default=os.environ.get("BENCH_DATABASE_URL"))
+    parser.add_argument("--contacts", type=int, default=10_000_000)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--reset", action="store_true", help="reload users and contacts before measuring")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--compare", help="report to diff against")
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("set BENCH_DATABASE_URL or --database-url to a dedicated benchmark database")
+
+    if args.reset:
+        asyncio.run(reset(args.database_url, args.users, args.contacts, args.workers))
+    report = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+# Micro-benchmarks for every ContactDB, UserDB and RoleDB method.
+#
+#   BENCH_DATABASE_URL=postgresql+asyncpg://... \
+#       python -m benchmarks.bench_repository --sizes 10000 100000 1000000 --reset
+#   python -m benchmarks.bench_repository --save-baseline   # refresh the baseline
+#   python -m benchmarks.bench_repository --compare         # diff against it
+#
+# The target database must be migrated. --reset TRUNCATEs users and contacts
+# and loads each dataset with the seeds COPY loader, so never point it at a
+# database whose data you need. Each method reports wall time, SQL
+# statements per call, rows returned and an EXPLAIN summary of its
+# statements, which makes query-count regressions (N+1) and plan flips
+# visible next to the timings.
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from src.database.seeds import load
+from src.repository.contacts import ContactDB
+from src.repository.roles import RoleDB
+from src.repository.users import UserDB
+from src.schemas.contacts import ContactCreate, ContactUpdate
+from src.schemas.roles import RoleEnum
+from src.schemas.users import UserModel
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "repository.json")
+USERS = 100
+
+
+class QueryLog:
+    def __init__(self) -> None:
+        self.statements: list[tuple[str, tuple]] = []
+        self.elapsed = 0.0
+        self._started: list[float] = []
+
+    def attach(self, engine):
+        @event.listens_for(engine.sync_engine, "before_cursor_execute")
+        def before(conn, cursor, statement, parameters, context, executemany):
+            self._started.append(time.perf_counter())
+
+        @event.listens_for(engine.sync_engine, "after_cursor_execute")
+        def after(conn, cursor, statement, parameters, context, executemany):
+            self.elapsed += time.perf_counter() - self._started.pop()
+            self.statements.append((statement, parameters))
+
+    @contextmanager
+    def capture(self):
+        self.statements, self.elapsed = [], 0.0
+        yield self
+
+
+def row_count(result) -> int:
+    if result is None:
+        return 0
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    return 1
+
+
+def summarize_plan(plan: dict) -> dict:
+    nodes, scans = [plan], []
+    while nodes:
+        node = nodes.pop()
+        if "Scan" in node["Node Type"]:
+            scans.append(f"{node['Node Type']} on {node.get('Relation Name', '?')}"
+                         + (f" using {node['Index Name']}" if "Index Name" in node else ""))
+        nodes.extend(node.get("Plans", []))
+    return {"node": plan["Node Type"], "total_cost": plan["Total Cost"], "plan_rows": plan["Plan Rows"],
+            "scans": scans}
+
+
+async def explain(session: AsyncSession, statements: list) -> list:
+    plans = []
+    for statement, parameters in statements:
+        # Plain EXPLAIN does not execute, so DELETEs are safe to plan too.
+        if not statement.lstrip().upper().startswith(("SELECT", "DELETE")):
+            continue
+        connection = await session.connection()
+        result = await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+        plan = result.scalar()
+        plan = json.loads(plan) if isinstance(plan, str) else plan
+        plans.append(summarize_plan(plan[0]["Plan"]))
+    return plans
+
+
+class Bench:
+    def __init__(self, database_url: str, iterations: int) -> None:
+        self.engine = create_async_engine(database_url)
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False, class_=AsyncSession)
+        self.log = QueryLog()
+        self.log.attach(self.engine)
+        self.iterations = iterations
+        self.rng = random.Random(42)
+        self.counter = 0
+
+    def unique(self) -> str:
+        self.counter += 1
+        return f"{int(time.time())}{self.counter}"
+
+    async def measure(self, name: str, call, setup=None) -> dict:
+        # setup runs outside the capture and its result is passed to call,
+        # for methods that consume the rows they work on.
+        timings, queries, rows, plans = [], [], 0, []
+        for i in range(self.iterations):
+            async with self.sessions() as session:
+                prepared = await setup(session) if setup is not None else None
+                with self.log.capture() as log:
+                    started = time.perf_counter()
+                    result = await (call(session, prepared) if setup is not None else call(session))
+                    timings.append(time.perf_counter() - started)
+                queries.append(len(log.statements))
+                rows = row_count(result)
+                if i == 0:
+                    plans = await explain(session, log.statements)
+        timings.sort()
+        to_ms = lambda seconds: round(seconds * 1000, 3)
+        report = {"calls": self.iterations,
+                  "wall_ms": {"p50": to_ms(timings[len(timings) // 2]),
+                              "p95": to_ms(timings[min(len(timings) - 1, int(len(timings) * 0.95))]),
+                              "mean": to_ms(statistics.fmean(timings))},
+                  "queries_per_call": round(statistics.fmean(queries), 2),
+                  "rows": rows,
+                  "plans": plans}
+        print(f"  {name:38} p50 {report['wall_ms']['p50']:9.3f} ms  "
+              f"queries {report['queries_per_call']:5}  rows {rows}")
+        return report
+
+    async def fixtures(self) -> dict:
+        async with self.sessions() as session:
+            row = (await session.execute(text(
+                "SELECT u.email, c.id, c.phone_e164 FROM users u JOIN contacts c ON c.user_id = u.id "
+                "ORDER BY u.id LIMIT 1"))).one()
+            user = await UserDB(session).get_user_by_email(row.email)
+            return {"user": user, "email": row.email, "contact_id": row.id,
+                    "phone_e164": row.phone_e164 or "+380501234567"}
+
+    async def run(self) -> dict:
+        fx = await self.fixtures()
+        user, email, contact_id, phone_e164 = fx["user"], fx["email"], fx["contact_id"], fx["phone_e164"]
+
+        def new_contact():
+            return ContactCreate(first_name="Bench", last_name="Mark", email=f"bench{self.unique()}@example.com",
+                                 phone="+380501234567", birthday=date(1990, 5, 17))
+
+        async def create_and_delete(session):
+            contact_db = ContactDB(session)
+            contact = await contact_db.create_contact(new_contact(), user)
+            return await contact_db.delete_contact(contact.id, user)
+
+        async def duplicates(session):
+            contact_db = ContactDB(session)
+            return [(await contact_db.create_contact(new_contact(), user)).id for _ in range(3)]
+
+        async def merge_and_delete(session, ids):
+            contact_db = ContactDB(session)
+            contact = await contact_db.merge_contacts(ids[0], ids[1:], user)
+            return await contact_db.delete_contact(contact.id, user)
+
+        async def user_with_contacts(session, count: int):
+            owner = await create_user(session)
+            await session.execute(text(
+                "INSERT INTO contacts (first_name, last_name, email, phone, birthday, user_id) "
+                "SELECT 'Bench', 'Mark', 'bench' || n || '@example.com', '+380501234567', DATE '1990-05-17', "
+                ":user_id FROM generate_series(1, :count) AS n"), {"user_id": owner.id, "count": count})
+            await session.commit()
+            return owner
+
+        async def create_user(session):
+            return await UserDB(session).create_user(UserModel(username=f"b{self.unique()}"[:16],
+                                                               email=f"u{self.unique()}@example.com",
+                                                               password="secret1"))
+
+        cases = {
+            "ContactDB.get_contacts": lambda s: ContactDB(s).get_contacts(0, 50, user),
+            "ContactDB.get_contacts[filtered]": lambda s: ContactDB(s).get_contacts(0, 50, user, first_name="а"),
+            "ContactDB.get_contacts_all": lambda s: ContactDB(s).get_contacts_all(0, 50),
+            "ContactDB.get_contacts_all[filtered]": lambda s: ContactDB(s).get_contacts_all(0, 50, last_name="ко"),
+            "ContactDB.count_contacts": lambda s: ContactDB(s).count_contacts(user),
+            "ContactDB.count_contacts[filtered]": lambda s: ContactDB(s).count_contacts(user, first_name="а"),
+            "ContactDB.estimate_contacts_all": lambda s: ContactDB(s).estimate_contacts_all(),
+            "ContactDB.estimate_contacts_all[filtered]": lambda s: ContactDB(s).estimate_contacts_all(last_name="ко"),
+            "ContactDB.get_contact": lambda s: ContactDB(s).get_contact(contact_id, user),
+            "ContactDB.get_contacts_birthday": lambda s: ContactDB(s).get_contacts_birthday(30, user),
+            "ContactDB.get_contacts_by_user": lambda s: ContactDB(s).get_contacts_by_user(user),
+            "ContactDB.get_contacts_by_phone": lambda s: ContactDB(s).get_contacts_by_phone(phone_e164, user),
+            "ContactDB.create_contact+delete_contact": create_and_delete,
+            "ContactDB.update_contact": lambda s: ContactDB(s).update_contact(
+                contact_id, ContactUpdate(additional_info=f"bench {self.unique()}"), user),
+            "ContactDB.healthcheck": lambda s: ContactDB(s).healthcheck(),
+            "UserDB.get_user_by_email": lambda s: UserDB(s).get_user_by_email(email),
+            "UserDB.create_user": create_user,
+            "UserDB.confirmed_email": lambda s: UserDB(s).confirmed_email(email),
+            "UserDB.update_avatar": lambda s: UserDB(s).update_avatar(email, user.avatar),
+            "UserDB.set_default_avatar": lambda s: UserDB(s).set_default_avatar(user.id, "unused"),
+            "UserDB.update_password": lambda s: UserDB(s).update_password(email, user.password),
+            "RoleDB.get_role_by_name": lambda s: RoleDB(s).get_role_by_name(RoleEnum.user.value),
+            "RoleDB.load_role_ids": lambda s: RoleDB(s).load_role_ids(),
+        }
+        prepared_cases = {
+            "ContactDB.merge_contacts+delete_contact": (merge_and_delete, duplicates),
+            "ContactDB.delete_contacts_batch": (lambda s, owner: ContactDB(s).delete_contacts_batch(owner.id, 1000),
+                                                lambda s: user_with_contacts(s, 1000)),
+            "UserDB.delete_user": (lambda s, owner: UserDB(s).delete_user(owner.id, owner.email),
+                                   lambda s: user_with_contacts(s, 100)),
+        }
+        results = {}
+        for name, call in cases.items():
+            results[name] = await self.measure(name, call)
+        for name, (call, setup) in prepared_cases.items():
+            results[name] = await self.measure(name, call, setup)
+        return results
+
+
+async def reset(database_url: str, contacts: int, workers: int):
+    engine = create_async_engine(database_url)
+    async with engine.begin() as connection:
+        await connection.execute(text("TRUNCATE contacts, users RESTART IDENTITY CASCADE"))
+    await engine.dispose()
+    await load(users=USERS, contacts=contacts, seed=42, workers=workers, chunk_size=50_000,
+               password="secret1", database_url=database_url)
+
+
+async def run(args) -> dict:
+    report = {"meta": {"started_at": datetime.now(timezone.utc).isoformat(), "iterations": args.iterations,
+                       "users": USERS},
+              "sizes": {}}
+    for size in args.sizes:
+        if args.reset:
+            print(f"loading {size} contacts")
+            await reset(args.database_url, size, args.workers)
+        print(f"dataset {size}")
+        bench = Bench(args.database_url, args.iterations)
+        try:
+            report["sizes"][str(size)] = await bench.run()
+        finally:
+            await bench.engine.dispose()
+    return report
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> int:
+    regressions = 0
+    for size, methods in current["sizes"].items():
+        old_methods = baseline["sizes"].get(size, {})
+        for name, new in methods.items():
+            old = old_methods.get(name)
+            if old is None:
+                print(f"{size:>8} {name:38} new")
+                continue
+            before, after = old["wall_ms"]["p50"], new["wall_ms"]["p50"]
+            change = (after - before) / before * 100 if before else 0.0
+            flags = []
+            if change > threshold:
+                flags.append("SLOWER")
+            if new["queries_per_call"] > old["queries_per_call"]:
+                flags.append(f"QUERIES {old['queries_per_call']} -> {new['queries_per_call']}")
+            if [p["scans"] for p in new["plans"]] != [p["scans"] for p in old["plans"]]:
+                flags.append("PLAN CHANGED")
+            regressions += bool(flags)
+            print(f"{size:>8} {name:38} {before:9.3f} -> {after:9.3f} ms {change:+6.1f}%  {' '.join(flags)}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Repository micro-benchmarks")
+    parser.add_argument("--database-url", default=os.environ.get("BENCH_DATABASE_URL"))
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--reset", action="store_true", help="reload each dataset before measuring")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--save-baseline", action="store_true", help=f"write the report to {BASELINE}")
+    parser.add_argument("--compare", nargs="?", const=BASELINE, help="baseline to diff against")
+    parser.add_argument("--threshold", type=float, default=15.0, help="slowdown flagged, percent")
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("set BENCH_DATABASE_URL or --database-url to a dedicated benchmark database")
+
+    report = asyncio.run(run(args))
+    for path in filter(None, [args.output, BASELINE if args.save_baseline else None]):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if args.compare:
+        with open(args.compare) as f:
+            raise SystemExit(1 if compare(json.load(f), report, args.threshold) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+# End-to-end load test for the API.
+#
+#   python -m benchmarks.load_test --compose --start-server --duration 60 \
+#       --concurrency 50 --output results/$(git rev-parse --short HEAD).json
+#   python -m benchmarks.load_test compare results/base.json results/new.json
+#
+# --compose brings up postgres and redis from docker-compose.yml and runs
+# the migrations, --start-server launches the app against them through
+# src.server. Bench users are signed up and confirmed through the API
+# (confirmation tokens are minted with the app's SECRET_KEY) and get contacts
+# bulk loaded with the seeds generator. Each virtual user logs in on its own,
+# so it holds its own refresh token family, and sends its own X-Forwarded-For,
+# so the per-client rate limits apply as they would to real clients; 429s are
+# reported separately from errors.
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timezone
+
+import asyncpg
+import httpx
+
+from src.config.config import settings
+from src.database.seeds import CONTACT_COLUMNS, REFERENCE_DATE, asyncpg_dsn, generate_contacts_chunk
+
+PASSWORD = "secret1"
+
+# (name, weight) of the operations a virtual user picks from.
+MIX = [
+    ("list_contacts", 35),
+    ("search_contacts", 15),
+    ("birthdays", 10),
+    ("get_contact", 20),
+    ("create_contact", 5),
+    ("update_contact", 5),
+    ("refresh_token", 10),
+]
+
+
+@dataclass
+class BenchUser:
+    email: str
+    ip: str
+    access_token: str = ""
+    refresh_token: str = ""
+    contact_ids: list = field(default_factory=list)
+
+    @property
+    def headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.access_token}", "X-Forwarded-For": self.ip}
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, name: str, status: int, elapsed: float):
+        self.statuses[name][status] += 1
+        if status < 400:
+            self.latencies[name].append(elapsed)
+
+    def report(self, duration: float) -> dict:
+        endpoints = {}
+        for name, statuses in sorted(self.statuses.items()):
+            samples = sorted(self.latencies[name])
+            total = sum(statuses.values())
+            endpoints[name] = {
+                "requests": total,
+                "ok": len(samples),
+                "rate_limited": statuses.get(429, 0),
+                "errors": sum(count for status, count in statuses.items() if status >= 400 and status != 429),
+                "statuses": {str(status): count for status, count in sorted(statuses.items())},
+                "throughput_rps": round(len(samples) / duration, 2),
+                **latency_summary(samples),
+            }
+        all_samples = sorted(sample for samples in self.latencies.values() for sample in samples)
+        return {"endpoints": endpoints,
+                "total": {"ok": len(all_samples), "throughput_rps": round(len(all_samples) / duration, 2),
+                          **latency_summary(all_samples)}}
+
+
+def percentile(samples: list, q: float) -> float:
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, max(0, round(q * len(samples)) - 1))
+    return samples[index]
+
+
+def latency_summary(samples: list) -> dict:
+    to_ms = lambda seconds: round(seconds * 1000, 2)
+    return {
+        "p50_ms": to_ms(percentile(samples, 0.50)),
+        "p95_ms": to_ms(percentile(samples, 0.95)),
+        "p99_ms": to_ms(percentile(samples, 0.99)),
+        "mean_ms": to_ms(statistics.fmean(samples)) if samples else 0.0,
+        "max_ms": to_ms(samples[-1]) if samples else 0.0,
+    }
+
+
+def compose_up():
+    subprocess.run(["docker", "compose", "up", "-d", "postgres", "redis"], check=True)
+    for _ in range(30):
+        if subprocess.run(["alembic", "upgrade", "head"]).returncode == 0:
+            return
+        time.sleep(2)
+    raise RuntimeError("Could not apply migrations")
+
+
+def start_server(port: int, workers: int, db_connection_budget: int | None = None) -> subprocess.Popen:
+    command = [sys.executable, "-m", "src.server", "--host", "127.0.0.1", "--port", str(port),
+               "--workers", str(workers)]
+    if db_connection_budget is not None:
+        command += ["--db-connection-budget", str(db_connection_budget)]
+    return subprocess.Popen(command)
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/api/healthchecker")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(1)
+    raise RuntimeError("Server did not become ready")
+
+
+async def login(client: httpx.AsyncClient, user: BenchUser):
+    while True:
+        response = await client.post("/api/auth/login", data={"username": user.email, "password": PASSWORD},
+                                     headers={"X-Forwarded-For": user.ip})
+        if response.status_code != 429:
+            break
+        await asyncio.sleep(float(response.headers.get("Retry-After", 1)))
+    response.raise_for_status()
+    tokens = response.json()
+    user.access_token, user.refresh_token = tokens["access_token"], tokens["refresh_token"]
+
+
+def client_ip(index: int) -> str:
+    return f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}"
+
+
+async def setup_users(client: httpx.AsyncClient, count: int, run_id: str) -> list[BenchUser]:
+    from src.services.auth import auth_service
+
+    users = [BenchUser(email=f"bench{run_id}.{i}@example.com", ip=client_ip(i)) for i in range(count)]
+    for i, user in enumerate(users):
+        response = await client.post("/api/auth/signup",
+                                     json={"username": f"bench{i:05d}", "email": user.email, "password": PASSWORD})
+        response.raise_for_status()
+        token = auth_service.create_email_token({"sub": user.email})
+        (await client.get(f"/api/auth/confirmed_email/{token}")).raise_for_status()
+    return users
+
+
+async def open_session(client: httpx.AsyncClient, user: BenchUser, index: int) -> BenchUser:
+    # Virtual users outnumber bench users. Sharing one refresh token would
+    # make their concurrent refreshes look like token reuse, which revokes
+    # the family, so each logs in separately; contact_ids stays shared.
+    session = replace(user, ip=client_ip(index))
+    await login(client, session)
+    return session
+
+
+async def seed_contacts(users: list[BenchUser], per_user: int, seed: int):
+    if not per_user:
+        return
+    connection = await asyncpg.connect(asyncpg_dsn(settings.database_url))
+    try:
+        rows_by_email = await connection.fetch("SELECT id, email FROM users WHERE email = ANY($1::text[])",
+                                               [user.email for user in users])
+        user_ids = {row["email"]: row["id"] for row in rows_by_email}
+        ordered_ids = [user_ids[user.email] for user in users]
+        first_id = await connection.fetchval("SELECT coalesce(max(id), 0) + 1 FROM contacts")
+        rows = generate_contacts_chunk((0, first_id, per_user * len(users), seed, 0, len(users), REFERENCE_DATE))
+        # The generator picks an owner index; map it to the bench user ids.
+        rows = [row[:-1] + (ordered_ids[row[-1]],) for row in rows]
+        await connection.copy_records_to_table("contacts", records=rows, columns=CONTACT_COLUMNS)
+        await connection.execute(
+            "SELECT setval(pg_get_serial_sequence('contacts', 'id'), (SELECT max(id) FROM contacts))"
+        )
+        await connection.execute("ANALYZE contacts")
+        owners = {user_id: user for user_id, user in zip(ordered_ids, users)}
+        for row in rows:
+            owners[row[-1]].contact_ids.append(row[0])
+    finally:
+        await connection.close()
+
+
+async def run_operation(client: httpx.AsyncClient, user: BenchUser, name: str, rng: random.Random):
+    if name == "list_contacts":
+        return await client.get("/api/contacts", params={"limit": 50, "offset": rng.randrange(0, 200, 50)},
+                                headers=user.headers)
+    if name == "search_contacts":
+        params = {rng.choice(["first_name", "last_name", "email"]): rng.choice("абвгдкмнопрстaeio")}
+        return await client.get("/api/contacts", params=params, headers=user.headers)
+    if name == "birthdays":
+        return await client.get(f"/api/contacts/birthday/{rng.choice([7, 14, 30])}", headers=user.headers)
+    if name == "get_contact":
+        contact_id = rng.choice(user.contact_ids) if user.contact_ids else 1
+        return await client.get(f"/api/contacts/{contact_id}", headers=user.headers)
+    if name == "create_contact":
+        suffix = f"{time.time_ns()}{rng.randrange(1000)}"
+        body = {"first_name": "Load", "last_name": "Test", "email": f"load{suffix}@example.com",
+                "phone": "+380501234567", "birthday": "1990-05-17"}
+        response = await client.post("/api/contacts", json=body, headers=user.headers)
+        if response.status_code == 200:
+            user.contact_ids.append(response.json()["id"])
+        return response
+    if name == "update_contact":
+        contact_id = rng.choice(user.contact_ids) if user.contact_ids else 1
+        return await client.put(f"/api/contacts/{contact_id}", json={"additional_info": f"updated {time.time()}"},
+                                headers=user.headers)
+    if name == "refresh_token":
+        response = await client.get("/api/auth/refresh_token",
+                                    headers={"Authorization": f"Bearer {user.refresh_token}",
+                                             "X-Forwarded-For": user.ip})
+        if response.status_code == 200:
+            tokens = response.json()
+            user.access_token, user.refresh_token = tokens["access_token"], tokens["refresh_token"]
+        return response
+    raise ValueError(name)
+
+
+async def virtual_user(client: httpx.AsyncClient, user: BenchUser, recorder: Recorder, deadline: float, seed: int):
+    rng = random.Random(seed)
+    names, weights = zip(*MIX)
+    while time.monotonic() < deadline:
+        name = rng.choices(names, weights)[0]
+        started = time.perf_counter()
+        try:
+            response = await run_operation(client, user, name, rng)
+            status = response.status_code
+        except httpx.TransportError:
+            status = 599
+        recorder.record(name, status, time.perf_counter() - started)
+
+
+def git_commit() -> str:
+    result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True)
+    return result.stdout.strip() or "unknown"
+
+
+async def run(args) -> dict:
+    server = None
+    if args.compose:
+        compose_up()
+    if args.start_server:
+        server = start_server(args.port, args.workers, args.db_connection_budget)
+    base_url = args.base_url or f"http://127.0.0.1:{args.port}"
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+            await wait_ready(client)
+            run_id = str(int(time.time()))
+            users = await setup_users(client, args.users, run_id)
+            await seed_contacts(users, args.contacts_per_user, args.seed)
+
+            sessions = await asyncio.gather(*(open_session(client, users[i % len(users)], i)
+                                              for i in range(args.concurrency)))
+
+            recorder = Recorder()
+            started = time.monotonic()
+            deadline = started + args.duration
+            await asyncio.gather(*(virtual_user(client, session, recorder, deadline, args.seed + i)
+                                   for i, session in enumerate(sessions)))
+            elapsed = time.monotonic() - started
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    return {
+        "meta": {"commit": git_commit(), "started_at": datetime.now(timezone.utc).isoformat(),
+                 "duration_s": round(elapsed, 2), "concurrency": args.concurrency, "users": args.users,
+                 "contacts_per_user": args.contacts_per_user, "server_workers": args.workers,
+                 "seed": args.seed, "mix": dict(MIX)},
+        **recorder.report(elapsed),
+    }
+
+
+def compare(baseline_path: str, current_path: str, threshold: float):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(current_path) as f:
+        current = json.load(f)
+    print(f"{'endpoint':18} {'metric':8} {baseline['meta']['commit']:>10} {current['meta']['commit']:>10}  change")
+    regressions = 0
+    names = sorted(set(baseline["endpoints"]) | set(current["endpoints"]))
+    for name in names + ["total"]:
+        old = baseline["total"] if name == "total" else baseline["endpoints"].get(name)
+        new = current["total"] if name == "total" else current["endpoints"].get(name)
+        if old is None or new is None:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps"):
+            before, after = old[metric], new[metric]
+            change = (after - before) / before * 100 if before else 0.0
+            worse = change < -threshold if metric == "throughput_rps" else change > threshold
+            regressions += worse
+            print(f"{name:18} {metric:8} {before:10.2f} {after:10.2f}  {change:+6.1f}%{'  REGRESSION' if worse else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API load test")
+    commands = parser.add_subparsers(dest="command")
+
+    diff = commands.add_parser("compare", help="compare two result files")
+    diff.add_argument("baseline")
+    diff.add_argument("current")
+    diff.add_argument("--threshold", type=float, default=10.0, help="regression threshold, percent")
+
+    parser.add_argument("--base-url", help="target a running server instead of --port")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--compose", action="store_true", help="start postgres/redis and migrate")
+    parser.add_argument("--start-server", action="store_true", help="launch the app for the run")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers with --start-server")
+    parser.add_argument("--db-connection-budget", type=int, help="Postgres connections shared by the workers")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--contacts-per-user", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        sys.exit(1 if compare(args.baseline, args.current, args.threshold) else 0)
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
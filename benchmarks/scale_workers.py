@@ -0,0 +1,76 @@
+# Load-test the production launcher at several worker counts.
+#
+#   python -m benchmarks.scale_workers --compose --workers 1 2 4 8 \
+#       --db-connection-budget 80 --duration 60 --output benchmarks/results/workers.md
+#
+# Each worker count gets a fresh `python -m src.server` and the same
+# benchmarks.load_test run; the server is stopped with SIGTERM between runs,
+# which also exercises the graceful drain. The Markdown table (and a JSON
+# file with the full reports next to it) is what documents the numbers, so
+# rerun it on the target hardware after changing server or pool settings.
+import argparse
+import asyncio
+import json
+import os
+from datetime import datetime, timezone
+
+from benchmarks.load_test import compose_up, git_commit, run as run_load_test
+
+
+def table(reports: dict, args) -> str:
+    lines = ["# Throughput by worker count",
+             "",
+             f"commit {git_commit()}, {datetime.now(timezone.utc):%Y-%m-%d}, {os.cpu_count()} CPUs, "
+             f"concurrency {args.concurrency}, {args.duration:.0f} s per run, "
+             f"DB connection budget {args.db_connection_budget or 'default'}",
+             "",
+             "| workers | req/s | p50 ms | p95 ms | p99 ms | errors | 429s | speedup |",
+             "|--------:|------:|-------:|-------:|-------:|-------:|-----:|--------:|"]
+    base = None
+    for workers, report in reports.items():
+        total = report["total"]
+        errors = sum(endpoint["errors"] for endpoint in report["endpoints"].values())
+        limited = sum(endpoint["rate_limited"] for endpoint in report["endpoints"].values())
+        base = base or total["throughput_rps"]
+        speedup = total["throughput_rps"] / base if base else 0.0
+        lines.append(f"| {workers} | {total['throughput_rps']:.1f} | {total['p50_ms']:.1f} | {total['p95_ms']:.1f} "
+                     f"| {total['p99_ms']:.1f} | {errors} | {limited} | {speedup:.2f}x |")
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test at several worker counts")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--db-connection-budget", type=int)
+    parser.add_argument("--compose", action="store_true", help="start postgres/redis and migrate first")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--contacts-per-user", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="benchmarks/results/workers.md")
+    args = parser.parse_args()
+
+    if args.compose:
+        compose_up()
+    reports = {}
+    for workers in args.workers:
+        print(f"--- {workers} workers")
+        reports[workers] = asyncio.run(run_load_test(argparse.Namespace(
+            compose=False, start_server=True, base_url=None, port=args.port, workers=workers,
+            db_connection_budget=args.db_connection_budget, users=args.users,
+            contacts_per_user=args.contacts_per_user, concurrency=args.concurrency,
+            duration=args.duration, seed=args.seed)))
+
+    markdown = table(reports, args)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        f.write(markdown)
+    with open(os.path.splitext(args.output)[0] + ".json", "w") as f:
+        json.dump({str(workers): report for workers, report in reports.items()}, f, indent=2, ensure_ascii=False)
+    print(markdown)
+
+
+if __name__ == "__main__":
+    main()
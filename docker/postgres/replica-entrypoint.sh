@@ -0,0 +1,12 @@
+#!/bin/bash
+# Clones the primary on first start, then runs as a hot standby.
+set -e
+if [ ! -s "$PGDATA/PG_VERSION" ]; then
+  until pg_basebackup -h postgres -U "$POSTGRES_USER" -D "$PGDATA" -R -X stream; do
+    echo "waiting for primary"
+    rm -rf "${PGDATA:?}"/*
+    sleep 2
+  done
+  chmod 0700 "$PGDATA"
+fi
+exec postgres -c hot_standby=on
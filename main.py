@@ -1,18 +1,81 @@
+import time
+
+# Taken before the other imports so the startup report includes import time.
+IMPORTS_STARTED = time.perf_counter()
+
+import asyncio
+import logging
+import os
 import re
+import uuid
+from contextlib import asynccontextmanager
+from math import ceil
 from typing import Callable
 
-import redis.asyncio as redis
-from fastapi import FastAPI, Request, status
+from fastapi import FastAPI, HTTPException, Request, Response, status
 from fastapi_limiter import FastAPILimiter
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 
 from src.config.config import settings
+from src.config.logging_config import request_id, setup_logging, should_sample
+from src.database.connect import database
+from src.database.redis_client import redis_client
+from src.repository.roles import RoleDB
 from src.routes.route_contacts import router as router_contacts
+from src.routes.route_stats import router as router_stats
 from src.routes.route_users import router as router_users
+from src.services.idempotency import IdempotentReplay
+from src.services.jobs import refresh_stats_views, resume_account_deletions
+from src.services.mail_queue import email_queue
+from src.services.metrics import EMAIL_QUEUE_DEPTH, RATE_LIMITED, REQUEST_LATENCY, REQUESTS_IN_FLIGHT, \
+    mark_process_dead, render_metrics
+from src.services.query_inspector import RequestQueries, current_queries, report
+from src.services.scheduler import run_periodically
+from src.services.startup import StartupTimer
+from src.services.tracing import trace_app
+
+setup_logging()
+logger = logging.getLogger("access")
+startup_timer = StartupTimer(IMPORTS_STARTED)
+startup_timer.mark("imports", IMPORTS_STARTED)
+
+
+async def warm_role_cache():
+    async with database.get_session() as session:
+        await RoleDB(session).load_role_ids()
+
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Independent warm-ups run concurrently; a new worker is ready after the
+    # slowest of them instead of their sum.
+    await asyncio.gather(
+        startup_timer.timed("redis", redis_client.ping()),
+        startup_timer.timed("rate_limiter", FastAPILimiter.init(redis_client, http_callback=rate_limit_callback)),
+        startup_timer.timed("db_pool", database.warm(settings.db_warm_connections), required=False),
+        startup_timer.timed("role_cache", warm_role_cache(), required=False),
+    )
+    background_jobs = [
+        asyncio.create_task(run_periodically(redis_client, "stats_views", settings.stats_refresh_seconds,
+                                             refresh_stats_views,
+                                             check_interval=min(60, settings.stats_refresh_seconds))),
+        asyncio.create_task(run_periodically(redis_client, "account_deletions", 60, resume_account_deletions)),
+    ]
+    startup_timer.report()
+    try:
+        yield
+    finally:
+        for job in background_jobs:
+            job.cancel()
+        await database.dispose()
+        await redis_client.aclose()
+        mark_process_dead(os.getpid())
+
+
+app = FastAPI(lifespan=lifespan)
+trace_app(app)
 app.mount("/static", StaticFiles(directory="src/static"), name="static")
 
 origins = ["*"]
@@ -23,21 +86,37 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "X-Total-Count-Estimated", "Idempotent-Replayed"],
 )
 
 app.include_router(router_users, prefix="/api", tags=["auth"])
 app.include_router(router_contacts, prefix="/api", tags=["contacts"])
+app.include_router(router_stats, prefix="/api", tags=["admin"])
 
 
-@app.on_event("startup")
-async def startup():
-    r = await redis.Redis(
-        host=settings.redis_host,
-        port=settings.redis_port,
-        db=0,
-        password=settings.redis_password,
-    )
-    await FastAPILimiter.init(r)
+def route_template(request: Request) -> str:
+    # Route templates keep label cardinality bounded, unlike raw paths.
+    route = request.scope.get("route")
+    return getattr(route, "path", "unmatched")
+
+
+async def rate_limit_callback(request: Request, response: Response, pexpire: int):
+    RATE_LIMITED.labels(route=route_template(request)).inc()
+    raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too Many Requests",
+                        headers={"Retry-After": str(ceil(pexpire / 1000))})
+
+
+@app.exception_handler(IdempotentReplay)
+async def idempotent_replay_handler(request: Request, exc: IdempotentReplay):
+    return exc.response
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    for state, depth in (await email_queue.depth()).items():
+        EMAIL_QUEUE_DEPTH.labels(state=state).set(depth)
+    content, media_type = render_metrics()
+    return Response(content=content, media_type=media_type)
 
 
 user_agent_ban_list = [r"Googlebot", r"Python-urllib"]
@@ -45,9 +124,7 @@ user_agent_ban_list = [r"Googlebot", r"Python-urllib"]
 
 @app.middleware("http")
 async def user_agent_ban_middleware(request: Request, call_next: Callable):
-    print(request.headers.get("Authorization"))
-    user_agent = request.headers.get("user-agent")
-    print(user_agent)
+    user_agent = request.headers.get("user-agent") or ""
     for ban_pattern in user_agent_ban_list:
         if re.search(ban_pattern, user_agent):
             return JSONResponse(
@@ -56,3 +133,51 @@ async def user_agent_ban_middleware(request: Request, call_next: Callable):
             )
     response = await call_next(request)
     return response
+
+
+@app.middleware("http")
+async def metrics_middleware(request: Request, call_next: Callable):
+    REQUESTS_IN_FLIGHT.inc()
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        REQUESTS_IN_FLIGHT.dec()
+        REQUEST_LATENCY.labels(method=request.method, route=route_template(request),
+                               status=str(status_code)).observe(time.perf_counter() - started)
+
+
+if settings.db_inspect_enabled:
+    @app.middleware("http")
+    async def query_inspector_middleware(request: Request, call_next: Callable):
+        queries = RequestQueries()
+        token = current_queries.set(queries)
+        try:
+            response = await call_next(request)
+        finally:
+            current_queries.reset(token)
+        response.headers.update(report(request.method, request.url.path, queries))
+        return response
+
+
+@app.middleware("http")
+async def request_context_middleware(request: Request, call_next: Callable):
+    token = request_id.set(request.headers.get("X-Request-ID") or uuid.uuid4().hex)
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        response.headers["X-Request-ID"] = request_id.get()
+        return response
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        route = route_template(request)
+        if should_sample(route, status_code, elapsed_ms):
+            logger.info("request", extra={"method": request.method, "route": route, "path": request.url.path,
+                                          "status": status_code, "elapsed_ms": round(elapsed_ms, 2),
+                                          "client": request.client.host if request.client else None})
+        request_id.reset(token)
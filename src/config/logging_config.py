@@ -0,0 +1,96 @@
+import atexit
+import copy
+import json
+import logging
+import queue
+import random
+import re
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from src.config.config import settings
+
+request_id: ContextVar[str | None] = ContextVar("request_id", default=None)
+
+SECRET_KEYS = re.compile(r"authorization|password|passwd|token|secret|cookie|api_key", re.IGNORECASE)
+SECRET_VALUES = [
+    (re.compile(r"(Bearer\s+)[A-Za-z0-9._~+/=-]+", re.IGNORECASE), r"\1[REDACTED]"),
+    (re.compile(r"((?:password|token|secret)\w*['\"]?\s*[:=]\s*['\"]?)[^\s'\",&]+", re.IGNORECASE), r"\1[REDACTED]"),
+]
+RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+
+def redact(value):
+    if isinstance(value, dict):
+        return {k: "[REDACTED]" if SECRET_KEYS.search(str(k)) else redact(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    if isinstance(value, str):
+        for pattern, replacement in SECRET_VALUES:
+            value = pattern.sub(replacement, value)
+    return value
+
+
+class RequestIdFilter(logging.Filter):
+    # Runs in the calling task, where the request's context variable is set.
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+        return True
+
+
+class LocalQueueHandler(QueueHandler):
+    # The stock prepare() interpolates the message and renders the traceback
+    # on the calling thread, then drops exc_info and args so the record can
+    # cross a process boundary. This queue never leaves the process, so the
+    # record is only copied and all of that is left to the listener.
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return copy.copy(record)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in RESERVED})
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        # Interpolation, traceback rendering and redaction all happen here,
+        # on the listener thread, off the hot path.
+        return json.dumps(redact(entry), default=str, ensure_ascii=False)
+
+
+def should_sample(route: str, status_code: int, elapsed_ms: float) -> bool:
+    # Errors and slow requests are always kept; busy routes are sampled.
+    if status_code >= 500 or elapsed_ms >= settings.log_slow_request_ms:
+        return True
+    rate = settings.log_sample_rates.get(route, 1.0)
+    return rate >= 1.0 or random.random() < rate
+
+
+_listener: QueueListener | None = None
+
+
+def setup_logging():
+    global _listener
+    if _listener is not None:
+        return
+    # Callers only copy records onto an in-memory queue; formatting, the
+    # traceback and the blocking write to stdout happen on the listener's thread.
+    log_queue: queue.Queue = queue.Queue(-1)
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter())
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    handler = LocalQueueHandler(log_queue)
+    handler.addFilter(RequestIdFilter())
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(settings.log_level)
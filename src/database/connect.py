@@ -1,16 +1,52 @@
+import asyncio
 import contextlib
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 
 from src.config.config import settings
+from src.database.replicas import Replica, ReplicaRouter
 from src.repository.contacts import ContactDB
+from src.repository.stats import StatsDB
 from src.repository.users import UserDB
+from src.services.birthdays import birthday_digest
+from src.services.cache import contacts_cache
+from src.services.duplicates import duplicate_finder
+from src.services.metrics import InstrumentedPool, instrument_engine
+from src.services.query_inspector import inspect_engine
+from src.services.tracing import trace_engine
+
+
+def build_engine(url: str):
+    engine = create_async_engine(url, echo=settings.db_echo, poolclass=InstrumentedPool,
+                                 pool_size=settings.db_pool_size, max_overflow=settings.db_max_overflow)
+    instrument_engine(engine)
+    if settings.db_inspect_enabled:
+        inspect_engine(engine)
+    trace_engine(engine)
+    return engine
 
 
 class Database:
     def __init__(self):
-        self._engine = create_async_engine(settings.database_url, echo=True)
+        self._engine = build_engine(settings.database_url)
+        self.replicas = ReplicaRouter([Replica(f"replica-{index}", build_engine(url))
+                                       for index, url in enumerate(settings.database_replica_urls)])
         self._async_session: async_sessionmaker = async_sessionmaker(autoflush=False, autocommit=False, bind=self._engine, class_=AsyncSession)
 
+    async def warm(self, connections: int):
+        # Concurrent checkouts force the pool to open distinct connections, so
+        # the TCP and auth handshakes happen before the first request.
+        async def checkout(engine):
+            async with engine.connect() as connection:
+                await connection.exec_driver_sql("SELECT 1")
+
+        engines = [self._engine, *self.replicas.engines()]
+        connections = min(connections, settings.db_pool_size)
+        await asyncio.gather(*(checkout(engine) for engine in engines for _ in range(connections)))
+
+    async def dispose(self):
+        await self._engine.dispose()
+        await self.replicas.dispose()
+
     @contextlib.asynccontextmanager
     async def get_session(self):
         async with self._async_session() as session:
@@ -21,9 +57,17 @@ class Database:
 
     async def get_contact_db(self) -> ContactDB:
         async with self.get_session() as session:
-            return ContactDB(session)
+            return ContactDB(session, cache=contacts_cache, birthdays=birthday_digest, replicas=self.replicas,
+                             duplicates=duplicate_finder)
 
 
     async def get_user_db(self) -> UserDB:
         async with self.get_session() as session:
-            return UserDB(session)
+            return UserDB(session, replicas=self.replicas)
+
+    async def get_stats_db(self) -> StatsDB:
+        async with self.get_session() as session:
+            return StatsDB(session)
+
+
+database = Database()
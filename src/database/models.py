@@ -1,6 +1,6 @@
 from datetime import date
 
-from sqlalchemy import Integer, String, Date, DateTime, func, ForeignKey, Boolean
+from sqlalchemy import Integer, String, Date, DateTime, func, ForeignKey, Boolean, Index
 from sqlalchemy.orm import Mapped, mapped_column, DeclarativeBase, relationship
 
 
@@ -10,16 +10,25 @@ class Base(DeclarativeBase):
 
 class Contact(Base):
     __tablename__ = 'contacts'
-    id: Mapped[int] = mapped_column('id', Integer, primary_key=True, index=True)
+    # Hash-partitioned on user_id, so the partition key is part of the primary
+    # key and email is unique per user rather than globally.
+    __table_args__ = (
+        Index('ix_contacts_user_id_id', 'user_id', 'id'),
+        Index('uq_contacts_user_id_email', 'user_id', 'email', unique=True),
+        Index('ix_contacts_user_id_phone_e164', 'user_id', 'phone_e164'),
+        {'postgresql_partition_by': 'HASH (user_id)'},
+    )
+    id: Mapped[int] = mapped_column('id', Integer, primary_key=True, autoincrement=True)
     first_name: Mapped[str] = mapped_column(String(50), index=True, nullable=False)
     last_name: Mapped[str] = mapped_column(String(50), index=True, nullable=False)
-    email: Mapped[str] = mapped_column(String(50), unique=True, index=True, nullable=False)
+    email: Mapped[str] = mapped_column(String(50), nullable=False)
     phone: Mapped[str] = mapped_column(String(50), index=True, nullable=False)
+    phone_e164: Mapped[str | None] = mapped_column(String(16), nullable=True)
     birthday: Mapped[date] = mapped_column(Date)
     additional_info: Mapped[str | None] = mapped_column(String, nullable=True)
     created_at: Mapped[date] = mapped_column('created_at', DateTime, default=func.now(), nullable=True)
     updated_at: Mapped[date] = mapped_column('updated_at', DateTime, default=func.now(), onupdate=func.now(), nullable=True)
-    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'), nullable=True)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'), primary_key=True)
     user: Mapped["User"] = relationship("User", backref='contacts', lazy='joined')
 
 
@@ -36,7 +45,6 @@ class User(Base):
     password: Mapped[str] = mapped_column(String(255), nullable=False)
     email: Mapped[str] = mapped_column(String(50), unique=True, index=True, nullable=False)
     avatar: Mapped[str | None] = mapped_column(String(255), nullable=True)
-    refresh_token: Mapped[str | None] = mapped_column(String, nullable=True)
     created_at: Mapped[date] = mapped_column('created_at', DateTime, default=func.now())
     updated_at: Mapped[date] = mapped_column('updated_at', DateTime, default=func.now(), onupdate=func.now())
     role_id: Mapped[int] = mapped_column(Integer, ForeignKey('roles.id'), nullable=True)
@@ -0,0 +1,213 @@
+# Online conversion of `contacts` into a table hash-partitioned on user_id.
+#
+#   python -m src.database.partition_contacts prepare     # shadow table + mirror trigger
+#   python -m src.database.partition_contacts backfill    # copy existing rows in batches
+#   python -m src.database.partition_contacts indexes     # build indexes partition by partition
+#   python -m src.database.partition_contacts verify      # compare row counts and checksums
+#   python -m src.database.partition_contacts swap        # rename under a short exclusive lock
+#   python -m src.database.partition_contacts all         # the five steps above
+#   python -m src.database.partition_contacts drop-legacy # once the new table has proven itself
+#
+# Every step can be re-run. The app keeps serving reads and writes until the
+# swap, which holds an ACCESS EXCLUSIVE lock only for a few renames, so run
+# `verify` right before it. Afterwards `alembic upgrade head` sees a
+# partitioned table and skips its own (blocking) copy.
+import argparse
+import asyncio
+import time
+
+import asyncpg
+
+from src.config.config import settings
+from src.database.seeds import asyncpg_dsn
+
+SHADOW = "contacts_partitioned"
+PARTITIONS = 16
+COLUMNS = "id, first_name, last_name, email, phone, birthday, additional_info, created_at, updated_at, user_id"
+INDEXES = [
+    ("ix_contacts_user_id_id", "", "(user_id, id)"),
+    ("uq_contacts_user_id_email", "UNIQUE", "(user_id, email)"),
+    ("ix_contacts_first_name", "", "(first_name)"),
+    ("ix_contacts_last_name", "", "(last_name)"),
+    ("ix_contacts_phone", "", "(phone)"),
+]
+NEW_VALUES = ", ".join(f"NEW.{column}" for column in COLUMNS.split(", "))
+
+MIRROR_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION contacts_mirror() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        DELETE FROM {SHADOW} WHERE id = OLD.id AND user_id = OLD.user_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.user_id IS NOT NULL THEN
+        INSERT INTO {SHADOW} ({COLUMNS}) VALUES ({NEW_VALUES})
+        ON CONFLICT (id, user_id) DO NOTHING;
+    END IF;
+    RETURN NULL;
+END $$
+"""
+
+CHECKSUM = "SELECT count(*), coalesce(sum(hashtext(t::text)::bigint), 0) FROM (SELECT {columns} FROM {table} {where}) t"
+
+
+async def relkind(connection: asyncpg.Connection, name: str) -> str | None:
+    return await connection.fetchval("SELECT relkind::text FROM pg_class WHERE oid = to_regclass($1)", name)
+
+
+async def prepare(connection: asyncpg.Connection):
+    if await relkind(connection, "contacts") == "p":
+        print("contacts is already partitioned")
+        return
+    async with connection.transaction():
+        await connection.execute(f"""
+            CREATE TABLE IF NOT EXISTS {SHADOW} (
+                id integer NOT NULL DEFAULT nextval('contacts_id_seq'),
+                first_name varchar(50) NOT NULL,
+                last_name varchar(50) NOT NULL,
+                email varchar(50) NOT NULL,
+                phone varchar(50) NOT NULL,
+                birthday date NOT NULL,
+                additional_info varchar,
+                created_at timestamp,
+                updated_at timestamp,
+                user_id integer NOT NULL REFERENCES users (id),
+                CONSTRAINT {SHADOW}_pkey PRIMARY KEY (id, user_id)
+            ) PARTITION BY HASH (user_id)
+        """)
+        for remainder in range(PARTITIONS):
+            await connection.execute(
+                f"CREATE TABLE IF NOT EXISTS contacts_p{remainder:02d} PARTITION OF {SHADOW} "
+                f"FOR VALUES WITH (MODULUS {PARTITIONS}, REMAINDER {remainder})")
+        await connection.execute(MIRROR_FUNCTION)
+        # Short lock on contacts: from here on every write is mirrored.
+        await connection.execute("DROP TRIGGER IF EXISTS contacts_mirror ON contacts")
+        await connection.execute("CREATE TRIGGER contacts_mirror AFTER INSERT OR UPDATE OR DELETE ON contacts "
+                                 "FOR EACH ROW EXECUTE FUNCTION contacts_mirror()")
+    print(f"{SHADOW} ready with {PARTITIONS} partitions, mirror trigger installed")
+
+
+async def backfill(connection: asyncpg.Connection, batch_size: int, pause: float):
+    low, high = await connection.fetchrow("SELECT min(id), max(id) FROM contacts")
+    if low is None:
+        return
+    copied, started = 0, time.perf_counter()
+    for start in range(low, high + 1, batch_size):
+        # FOR SHARE makes a concurrent DELETE/UPDATE of these rows wait until
+        # the batch commits, so its trigger never races a stale copy. Rows the
+        # trigger already mirrored are newer and win the conflict.
+        result = await connection.execute(
+            f"INSERT INTO {SHADOW} ({COLUMNS}) "
+            f"SELECT {COLUMNS} FROM contacts WHERE id >= $1 AND id < $2 AND user_id IS NOT NULL FOR SHARE "
+            f"ON CONFLICT (id, user_id) DO NOTHING",
+            start, start + batch_size)
+        copied += int(result.rsplit(" ", 1)[1])
+        print(f"backfill: ids < {start + batch_size} done, {copied} rows copied "
+              f"({copied / (time.perf_counter() - started):.0f} rows/s)")
+        if pause:
+            await asyncio.sleep(pause)
+
+
+async def build_indexes(connection: asyncpg.Connection):
+    # A plain CREATE INDEX on the parent would lock out the mirror trigger (and
+    # with it every write to contacts) for the whole build. Instead create an
+    # invalid index ON ONLY the parent, build each partition's index
+    # concurrently and attach it; the parent index turns valid with the last one.
+    for name, unique, columns in INDEXES:
+        parent = f"{name}_new"
+        await connection.execute(f"CREATE {unique} INDEX IF NOT EXISTS {parent} ON ONLY {SHADOW} {columns}")
+        for remainder in range(PARTITIONS):
+            partition, index = f"contacts_p{remainder:02d}", f"{name}_p{remainder:02d}"
+            valid = await connection.fetchval(
+                "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass($1)", index)
+            if valid is False:
+                await connection.execute(f"DROP INDEX CONCURRENTLY {index}")
+            if not valid:
+                await connection.execute(f"CREATE {unique} INDEX CONCURRENTLY {index} ON {partition} {columns}")
+            attached = await connection.fetchval(
+                "SELECT 1 FROM pg_inherits WHERE inhrelid = to_regclass($1)", index)
+            if not attached:
+                await connection.execute(f"ALTER INDEX {parent} ATTACH PARTITION {index}")
+        print(f"index {name} built on {PARTITIONS} partitions")
+    await connection.execute(f"ANALYZE {SHADOW}")
+
+
+async def checksums(connection: asyncpg.Connection) -> tuple:
+    legacy = await connection.fetchrow(CHECKSUM.format(columns=COLUMNS, table="contacts",
+                                                       where="WHERE user_id IS NOT NULL"))
+    shadow = await connection.fetchrow(CHECKSUM.format(columns=COLUMNS, table=SHADOW, where=""))
+    orphans = await connection.fetchval("SELECT count(*) FROM contacts WHERE user_id IS NULL")
+    return tuple(legacy), tuple(shadow), orphans
+
+
+async def verify(connection: asyncpg.Connection) -> bool:
+    legacy, shadow, orphans = await checksums(connection)
+    print(f"contacts: {legacy[0]} rows, {SHADOW}: {shadow[0]} rows, {orphans} without user_id")
+    if orphans:
+        print("assign or delete contacts without user_id before the swap")
+    if legacy != shadow:
+        print("checksums differ; re-run backfill (writes in flight can also cause this)")
+    return legacy == shadow and not orphans
+
+
+async def swap(connection: asyncpg.Connection, lock_timeout: str):
+    if await relkind(connection, "contacts") == "p":
+        print("contacts is already partitioned")
+        return
+    async with connection.transaction():
+        await connection.execute(f"SET LOCAL lock_timeout = '{lock_timeout}'")
+        await connection.execute("LOCK TABLE contacts IN ACCESS EXCLUSIVE MODE")
+        # No full comparison here: the trigger has kept both tables equal since
+        # `verify`, and scanning millions of rows would stretch the lock.
+        await connection.execute("DROP TRIGGER contacts_mirror ON contacts")
+        await connection.execute("DROP FUNCTION contacts_mirror()")
+        await connection.execute("ALTER TABLE contacts RENAME TO contacts_legacy")
+        for index in await connection.fetch("SELECT indexname FROM pg_indexes WHERE tablename = 'contacts_legacy'"):
+            await connection.execute(f"ALTER INDEX {index['indexname']} RENAME TO {index['indexname']}_legacy")
+        await connection.execute("ALTER SEQUENCE contacts_id_seq OWNED BY NONE")
+        await connection.execute(f"ALTER TABLE {SHADOW} RENAME TO contacts")
+        await connection.execute("ALTER SEQUENCE contacts_id_seq OWNED BY contacts.id")
+        await connection.execute(f"ALTER INDEX {SHADOW}_pkey RENAME TO contacts_pkey")
+        await connection.execute(f"ALTER TABLE contacts RENAME CONSTRAINT {SHADOW}_user_id_fkey "
+                                 f"TO contacts_user_id_fkey")
+        for name, _, _ in INDEXES:
+            await connection.execute(f"ALTER INDEX {name}_new RENAME TO {name}")
+    print("swapped: contacts is partitioned, the old heap is contacts_legacy")
+
+
+async def drop_legacy(connection: asyncpg.Connection):
+    await connection.execute("DROP TABLE IF EXISTS contacts_legacy")
+    print("contacts_legacy dropped")
+
+
+async def run(args):
+    connection = await asyncpg.connect(asyncpg_dsn(args.database_url))
+    try:
+        if args.step in ("prepare", "all"):
+            await prepare(connection)
+        if args.step in ("backfill", "all"):
+            await backfill(connection, args.batch_size, args.pause)
+        if args.step in ("indexes", "all"):
+            await build_indexes(connection)
+        if args.step in ("verify", "all"):
+            if not await verify(connection) and args.step == "all":
+                raise SystemExit(1)
+        if args.step in ("swap", "all"):
+            await swap(connection, args.lock_timeout)
+        if args.step == "drop-legacy":
+            await drop_legacy(connection)
+    finally:
+        await connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Partition contacts by user_id without downtime")
+    parser.add_argument("step", choices=["prepare", "backfill", "indexes", "verify", "swap", "all", "drop-legacy"])
+    parser.add_argument("--database-url", default=settings.database_url)
+    parser.add_argument("--batch-size", type=int, default=20_000)
+    parser.add_argument("--pause", type=float, default=0.0, help="seconds to sleep between backfill batches")
+    parser.add_argument("--lock-timeout", default="5s", help="give up the swap instead of queueing behind traffic")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+import time
+
+import redis.asyncio as aioredis
+
+from src.config.config import settings
+from src.services.metrics import observe_redis
+
+
+class InstrumentedAsyncRedis(aioredis.Redis):
+    async def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            observe_redis("async", str(args[0]), started)
+
+
+redis_client = InstrumentedAsyncRedis(host=settings.redis_host,
+                                      port=settings.redis_port,
+                                      db=0,
+                                      password=settings.redis_password
+                                      )
@@ -0,0 +1,118 @@
+import asyncio
+import itertools
+import logging
+import time
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+from src.config.config import settings
+from src.database.redis_client import redis_client
+from src.services.metrics import DB_READS
+
+logger = logging.getLogger(__name__)
+
+# 0 when the replica has replayed everything it received; otherwise the age of
+# the last replayed transaction. An idle primary would make the plain
+# now() - pg_last_xact_replay_timestamp() grow forever.
+LAG_SQL = text("""
+    SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+           END
+""")
+
+
+class Replica:
+    def __init__(self, name: str, engine: AsyncEngine):
+        self.name = name
+        self.engine = engine
+        self.sessionmaker = async_sessionmaker(autoflush=False, autocommit=False, bind=engine, class_=AsyncSession,
+                                               expire_on_commit=False)
+        self.down_until = 0.0
+        self.lag = 0.0
+        self.lag_checked = 0.0
+
+
+class ReplicaRouter:
+    def __init__(self, replicas: list[Replica]):
+        self._replicas = replicas
+        self._cycle = itertools.cycle(replicas) if replicas else None
+
+    def __bool__(self):
+        return bool(self._replicas)
+
+    @staticmethod
+    def _sticky_key(key: str) -> str:
+        return f"db:sticky:{key}"
+
+    async def pin(self, key: str):
+        # Called after a write: the writer reads from the primary until the
+        # replicas have had time to replay it.
+        try:
+            await redis_client.set(self._sticky_key(key), 1, ex=settings.db_sticky_seconds)
+        except Exception:
+            logger.warning("Could not pin reads to primary", extra={"key": key})
+
+    async def is_pinned(self, key: str) -> bool:
+        try:
+            return bool(await redis_client.exists(self._sticky_key(key)))
+        except Exception:
+            # Without Redis we cannot tell, and the primary is always correct.
+            return True
+
+    async def _check_lag(self, replica: Replica):
+        now = time.monotonic()
+        if now - replica.lag_checked < settings.db_replica_lag_check_seconds:
+            return
+        replica.lag_checked = now
+        async with replica.sessionmaker() as session:
+            replica.lag = float((await session.execute(LAG_SQL)).scalar() or 0)
+
+    async def _pick(self) -> Replica | None:
+        for _ in range(len(self._replicas)):
+            replica = next(self._cycle)
+            if replica.down_until > time.monotonic():
+                continue
+            try:
+                await self._check_lag(replica)
+            except (DBAPIError, OSError, asyncio.TimeoutError):
+                self._mark_down(replica)
+                continue
+            if replica.lag <= settings.db_replica_max_lag_seconds:
+                return replica
+        return None
+
+    def _mark_down(self, replica: Replica):
+        logger.warning("Replica unavailable, reading from primary", extra={"replica": replica.name})
+        replica.down_until = time.monotonic() + settings.db_replica_retry_seconds
+
+    async def scalars(self, stmt, sticky_key: str | None = None) -> list | None:
+        # None means "use the primary": no healthy replica, too much lag, the
+        # caller just wrote, or the replica failed mid-query.
+        if not self._replicas:
+            return None
+        if sticky_key is not None and await self.is_pinned(sticky_key):
+            DB_READS.labels(target="primary", reason="sticky").inc()
+            return None
+        replica = await self._pick()
+        if replica is None:
+            DB_READS.labels(target="primary", reason="unavailable").inc()
+            return None
+        try:
+            async with replica.sessionmaker() as session:
+                result = await session.execute(stmt)
+                rows = list(result.scalars().all())
+        except (DBAPIError, OSError, asyncio.TimeoutError):
+            self._mark_down(replica)
+            DB_READS.labels(target="primary", reason="error").inc()
+            return None
+        DB_READS.labels(target="replica", reason="ok").inc()
+        return rows
+
+    def engines(self) -> list[AsyncEngine]:
+        return [replica.engine for replica in self._replicas]
+
+    async def dispose(self):
+        for replica in self._replicas:
+            await replica.engine.dispose()
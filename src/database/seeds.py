@@ -1,14 +1,31 @@
+import argparse
 import asyncio
+import multiprocessing
 import platform
+import random
+from datetime import date, datetime, timedelta
 
 import aiohttp
+import asyncpg
 import faker
 
+from src.config.config import settings
+from src.services.phones import to_e164
+
 NUMBER_CONTACTS = 5
+POOL_SIZE = 2000
+LOCALE = "uk_UA"
+# Birthdays and timestamps are relative to this day rather than the real one,
+# so a seed produces the same rows whenever it is loaded.
+REFERENCE_DATE = date(2024, 1, 1)
+
+USER_COLUMNS = ("id", "username", "password", "email", "created_at", "updated_at", "role_id", "confirmed")
+CONTACT_COLUMNS = ("id", "first_name", "last_name", "email", "phone", "phone_e164", "birthday", "additional_info",
+                   "created_at", "updated_at", "user_id")
 
 
 def generate_fake_data(num_contacts: int):
-    fake_data = faker.Faker("uk_UA")
+    fake_data = faker.Faker(LOCALE)
     fake_contacts_list = []
     for _ in range(num_contacts):
         contact = {
@@ -27,17 +44,146 @@ async def send_contact(session, url, contact):
     async with session.post(url, json=contact) as response:
         return await response.json()
 
-async def send_contacts_to_fastapi(contacts_list):
-    url = "http://127.0.0.1:8000/contacts"  # Замініть на вашу URL
-    async with aiohttp.ClientSession() as session:
+
+async def send_contacts_to_fastapi(contacts_list, url: str, token: str | None = None):
+    headers = {"Authorization": f"Bearer {token}"} if token else None
+    async with aiohttp.ClientSession(headers=headers) as session:
         tasks = [send_contact(session, url, contact) for contact in contacts_list]
         responses = await asyncio.gather(*tasks)
         return responses
 
-if __name__ == "__main__":
-    contacts_list = generate_fake_data(NUMBER_CONTACTS)
-    print(contacts_list)
+
+class Pools:
+    # Faker is slow per call, so each chunk samples value pools once and
+    # draws from them with a seeded Random. Faker's own locale weights still
+    # shape the name distribution.
+    def __init__(self, seed: int) -> None:
+        fake = faker.Faker(LOCALE)
+        fake.seed_instance(seed)
+        self.first_names = [fake.first_name() for _ in range(POOL_SIZE)]
+        self.last_names = [fake.last_name() for _ in range(POOL_SIZE)]
+        self.user_names = [fake.user_name()[:30] for _ in range(POOL_SIZE)]
+        self.domains = [fake.free_email_domain() for _ in range(50)]
+        self.phones = [(phone, to_e164(phone)) for phone in (fake.phone_number() for _ in range(POOL_SIZE))]
+        self.jobs = [fake.job()[:200] for _ in range(POOL_SIZE)]
+
+
+def birthday(rng: random.Random, today: date) -> date:
+    # Adult ages skewed towards 25-50, like a real address book.
+    age = min(max(int(rng.gauss(38, 13)), 18), 90)
+    return today - timedelta(days=age * 365 + rng.randrange(365))
+
+
+def generate_users_chunk(spec: tuple) -> list[tuple]:
+    chunk, first_id, count, seed, password, role_id, today = spec
+    rng = random.Random(seed * 1_000_003 + chunk)
+    pools = Pools(seed + chunk)
+    now = datetime.combine(today, datetime.min.time())
+    return [(user_id, rng.choice(pools.user_names)[:16].ljust(5, "0"), password,
+             f"user{user_id}@{rng.choice(pools.domains)}", now, now, role_id, True)
+            for user_id in range(first_id, first_id + count)]
+
+
+def generate_contacts_chunk(spec: tuple) -> list[tuple]:
+    chunk, first_id, count, seed, first_user_id, users, today = spec
+    rng = random.Random(seed * 1_000_033 + chunk)
+    pools = Pools(seed + chunk)
+    now = datetime.combine(today, datetime.min.time())
+    rows = []
+    for contact_id in range(first_id, first_id + count):
+        rows.append((contact_id,
+                     rng.choice(pools.first_names),
+                     rng.choice(pools.last_names),
+                     f"{rng.choice(pools.user_names)}.{contact_id}@{rng.choice(pools.domains)}"[:50],
+                     *rng.choice(pools.phones),
+                     birthday(rng, today),
+                     rng.choice(pools.jobs) if rng.random() < 0.7 else None,
+                     now,
+                     now,
+                     first_user_id + rng.randrange(users)))
+    return rows
+
+
+def chunk_specs(total: int, chunk_size: int, first_id: int, *extra):
+    for chunk, offset in enumerate(range(0, total, chunk_size)):
+        yield (chunk, first_id + offset, min(chunk_size, total - offset), *extra)
+
+
+async def copy_chunks(connection: asyncpg.Connection, table: str, columns: tuple, generator, specs, workers: int):
+    loop = asyncio.get_running_loop()
+    loaded = 0
+    with multiprocessing.Pool(workers) as pool:
+        rows_iter = pool.imap(generator, specs)
+        while True:
+            rows = await loop.run_in_executor(None, next, rows_iter, None)
+            if rows is None:
+                break
+            await connection.copy_records_to_table(table, records=rows, columns=columns)
+            loaded += len(rows)
+            print(f"{table}: {loaded} rows loaded")
+    await connection.execute(
+        f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT max(id) FROM {table}))"
+    )
+
+
+def asyncpg_dsn(database_url: str) -> str:
+    return database_url.replace("+asyncpg", "")
+
+
+async def load(users: int, contacts: int, seed: int, workers: int, chunk_size: int, password: str,
+               database_url: str = settings.database_url, today: date = REFERENCE_DATE):
+    from src.services.auth import auth_service
+
+    connection = await asyncpg.connect(asyncpg_dsn(database_url))
+    try:
+        role_id = await connection.fetchval("SELECT id FROM roles WHERE name = 'user'")
+        first_user_id = await connection.fetchval("SELECT coalesce(max(id), 0) + 1 FROM users")
+        first_contact_id = await connection.fetchval("SELECT coalesce(max(id), 0) + 1 FROM contacts")
+        # One hash for every generated user: bcrypt per row would dominate.
+        password_hash = auth_service.get_password_hash(password)
+
+        await copy_chunks(connection, "users", USER_COLUMNS, generate_users_chunk,
+                          chunk_specs(users, chunk_size, first_user_id, seed, password_hash, role_id, today),
+                          workers)
+        await copy_chunks(connection, "contacts", CONTACT_COLUMNS, generate_contacts_chunk,
+                          chunk_specs(contacts, chunk_size, first_contact_id, seed, first_user_id, users, today),
+                          workers)
+        await connection.execute("ANALYZE users")
+        await connection.execute("ANALYZE contacts")
+    finally:
+        await connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake data generator")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    http = commands.add_parser("http", help="POST a few contacts through the API")
+    http.add_argument("--number", type=int, default=NUMBER_CONTACTS)
+    http.add_argument("--url", default="http://127.0.0.1:8000/api/contacts")
+    http.add_argument("--token", help="access token of the owner")
+
+    copy = commands.add_parser("copy", help="bulk load users and contacts straight into Postgres")
+    copy.add_argument("--users", type=int, default=1000)
+    copy.add_argument("--contacts", type=int, default=100_000)
+    copy.add_argument("--seed", type=int, default=42)
+    copy.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    copy.add_argument("--chunk-size", type=int, default=50_000)
+    copy.add_argument("--password", default="secret", help="password of every generated user")
+    copy.add_argument("--today", type=date.fromisoformat, default=REFERENCE_DATE,
+                      help="day birthdays and timestamps are generated around, YYYY-MM-DD")
+
+    args = parser.parse_args()
     if platform.system() == 'Windows':
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
-    r = asyncio.run(send_contacts_to_fastapi(contacts_list))
+    if args.command == "http":
+        contacts_list = generate_fake_data(args.number)
+        print(contacts_list)
+        asyncio.run(send_contacts_to_fastapi(contacts_list, args.url, args.token))
+    else:
+        asyncio.run(load(args.users, args.contacts, args.seed, args.workers, args.chunk_size, args.password,
+                         today=args.today))
+
 
+if __name__ == "__main__":
+    main()
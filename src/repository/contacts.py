@@ -1,15 +1,24 @@
 import contextlib
+import json
+import logging
 from abc import ABC, abstractmethod
 from datetime import datetime, timedelta
 from typing import List, Optional
 
 from fastapi import HTTPException, status
-from sqlalchemy import select, func, text
+from sqlalchemy import delete, select, func, text
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import Contact, User
+from src.database.replicas import ReplicaRouter
 from src.schemas.contacts import ContactUpdate, ContactCreate
+from src.services.birthdays import BirthdayDigest
+from src.services.cache import ResponseCache
+from src.services.duplicates import DuplicateFinder
+from src.services.phones import to_e164
+
+logger = logging.getLogger(__name__)
 
 
 class ContactABC(ABC):
@@ -26,14 +35,30 @@ class ContactABC(ABC):
     async def get_contact(self, id: int) -> Contact:
         pass
 
+    @abstractmethod
+    async def count_contacts(self, user: User) -> int:
+        pass
+
+    @abstractmethod
+    async def estimate_contacts_all(self) -> int:
+        pass
+
 
     @abstractmethod
     async def get_contacts_birthday(self, days_number: int) -> List[Contact]:
         pass
 
+    @abstractmethod
+    async def get_contacts_by_user(self, user: User) -> List[Contact]:
+        pass
+
+    @abstractmethod
+    async def get_contacts_by_phone(self, phone_e164: str, user: User) -> List[Contact]:
+        pass
+
 
     @abstractmethod
-    async def create_contact(self, body: ContactCreate) -> Contact:
+    async def create_contact(self, body: ContactCreate, user: User) -> Contact:
         pass
 
     @abstractmethod
@@ -44,25 +69,72 @@ class ContactABC(ABC):
     async def delete_contact(self, id: int):
         pass
 
+    @abstractmethod
+    async def merge_contacts(self, contact_id: int, duplicate_ids: List[int], user: User) -> Contact:
+        pass
+
+    @abstractmethod
+    async def delete_contacts_batch(self, user_id: int, limit: int) -> int:
+        pass
+
 
 class ContactDB(ContactABC):
-    def __init__(self, session: AsyncSession) -> None:
+    def __init__(self, session: AsyncSession, cache: ResponseCache | None = None,
+                 birthdays: BirthdayDigest | None = None, replicas: ReplicaRouter | None = None,
+                 duplicates: DuplicateFinder | None = None) -> None:
         self._session = session
+        self._cache = cache
+        self._birthdays = birthdays
+        self._replicas = replicas
+        self._duplicates = duplicates
 
-    async def get_contacts(self, offset: int, limit: int,
-                           user: User,
-                           first_name: Optional[str] = None,
-                           last_name: Optional[str] = None,
-                           email: Optional[str] = None,) -> List[Contact]:
-        stmt = select(Contact).filter_by(user=user).offset(offset).limit(limit)
+    async def _read(self, stmt, user: User | None = None) -> List[Contact]:
+        if self._replicas:
+            rows = await self._replicas.scalars(stmt, sticky_key=f"user:{user.id}" if user is not None else None)
+            if rows is not None:
+                return rows
+        result = await self._session.execute(stmt)
+        return result.scalars().all()
+
+    async def _invalidate(self, user: User):
+        if self._replicas:
+            await self._replicas.pin(f"user:{user.id}")
+        if self._cache is not None:
+            await self._cache.invalidate(user.id)
+        if self._birthdays is not None:
+            await self._birthdays.invalidate(user.id)
+        if self._duplicates is not None:
+            await self._duplicates.invalidate(user.id)
+
+    @staticmethod
+    def _filter(stmt, first_name: Optional[str], last_name: Optional[str], email: Optional[str]):
         if first_name:
             stmt = stmt.where(Contact.first_name.ilike(f'%{first_name}%'))
         if last_name:
             stmt = stmt.where(Contact.last_name.ilike(f'%{last_name}%'))
         if email:
             stmt = stmt.where(Contact.email.ilike(f'%{email}%'))
-        result = await self._session.execute(stmt)
-        return result.scalars().all()
+        return stmt
+
+    async def get_contacts(self, offset: int, limit: int,
+                           user: User,
+                           first_name: Optional[str] = None,
+                           last_name: Optional[str] = None,
+                           email: Optional[str] = None,) -> List[Contact]:
+        stmt = select(Contact).filter_by(user=user).offset(offset).limit(limit)
+        stmt = self._filter(stmt, first_name, last_name, email)
+        return await self._read(stmt, user)
+
+    async def count_contacts(self, user: User,
+                             first_name: Optional[str] = None,
+                             last_name: Optional[str] = None,
+                             email: Optional[str] = None,) -> int:
+        # Exact: one user's contacts sit in a single partition, and without
+        # filters this is an index-only scan of ix_contacts_user_id_id.
+        stmt = select(func.count()).select_from(Contact).where(Contact.user_id == user.id)
+        stmt = self._filter(stmt, first_name, last_name, email)
+        rows = await self._read(stmt, user)
+        return rows[0]
 
 
     async def get_contacts_all(self, offset: int, limit: int,
@@ -70,16 +142,39 @@ class ContactDB(ContactABC):
                            last_name: Optional[str] = None,
                            email: Optional[str] = None,) -> List[Contact]:
         stmt = select(Contact).offset(offset).limit(limit)
-        if first_name:
-            stmt = stmt.where(Contact.first_name.ilike(f'%{first_name}%'))
-        if last_name:
-            stmt = stmt.where(Contact.last_name.ilike(f'%{last_name}%'))
-        if email:
-            stmt = stmt.where(Contact.email.ilike(f'%{email}%'))
-        result = await self._session.execute(stmt)
-        return result.scalars().all()
+        stmt = self._filter(stmt, first_name, last_name, email)
+        return await self._read(stmt)
+
+    async def estimate_contacts_all(self,
+                                    first_name: Optional[str] = None,
+                                    last_name: Optional[str] = None,
+                                    email: Optional[str] = None,) -> int:
+        # An exact count over every tenant costs as much as the listing itself,
+        # so this reads planner statistics instead of rows.
+        if not (first_name or last_name or email):
+            # A partitioned parent keeps no reltuples of its own; sum its partitions.
+            result = await self._session.execute(text(
+                "SELECT coalesce(sum(greatest(reltuples, 0)), 0) FROM pg_class "
+                "WHERE (oid = 'contacts'::regclass AND relkind = 'r') "
+                "OR oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = 'contacts'::regclass)"))
+            return int(result.scalar())
+        stmt = self._filter(select(Contact.id), first_name, last_name, email)
+        # Compiled for the engine's own driver, so the filters stay bound
+        # parameters instead of being pasted into the SQL.
+        connection = await self._session.connection()
+        compiled = stmt.compile(dialect=connection.dialect)
+        params = compiled.construct_params()
+        args = tuple(params[name] for name in compiled.positiontup)
+        plan = (await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", args)).scalar()
+        plan = json.loads(plan) if isinstance(plan, str) else plan
+        return int(plan[0]["Plan"]["Plan Rows"])
 
     async def get_contact(self, id: int, user: User) -> Contact:
+        stmt = select(Contact).where(Contact.id == id).filter_by(user=user)
+        rows = await self._read(stmt, user)
+        return rows[0] if rows else None
+
+    async def _get_contact_for_write(self, id: int, user: User) -> Contact:
         stmt = select(Contact).where(Contact.id == id).filter_by(user=user)
         result = await self._session.execute(stmt)
         return result.scalars().first()
@@ -90,61 +185,106 @@ class ContactDB(ContactABC):
         today_month_day = today.strftime('%m-%d')
         next_week_month_day = next_week.strftime('%m-%d')
 
-        print(f"Searching for birthdays between {today_month_day} and {next_week_month_day}")
-
         stmt = select(Contact).where(
             func.to_char(Contact.birthday, 'MM-DD').between(today_month_day, next_week_month_day)
         ).filter_by(user=user)
-        result = await self._session.execute(stmt)
-        return result.scalars().all()
+        return await self._read(stmt, user)
+
+    async def get_contacts_by_user(self, user: User) -> List[Contact]:
+        stmt = select(Contact).filter_by(user=user)
+        return await self._read(stmt, user)
+
+    async def get_contacts_by_phone(self, phone_e164: str, user: User) -> List[Contact]:
+        # user_id first in the index keeps the lookup inside one partition.
+        stmt = select(Contact).where(Contact.user_id == user.id, Contact.phone_e164 == phone_e164).order_by(Contact.id)
+        return await self._read(stmt, user)
 
-    async def create_contact(self, body: ContactCreate) -> Contact:
-        stmt = select(Contact).where(Contact.email == body.email)
-        contact = await self._session.execute(stmt)
-        if contact:
+    async def create_contact(self, body: ContactCreate, user: User) -> Contact:
+        stmt = select(Contact).where(Contact.email == body.email).filter_by(user_id=user.id)
+        result = await self._session.execute(stmt)
+        if result.scalars().first():
             raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Contact with this email already exists")
         contact = Contact(
             first_name=body.first_name,
             last_name=body.last_name,
             email=body.email,
             phone=body.phone,
+            phone_e164=to_e164(body.phone),
             birthday=body.birthday,
-            additional_info=body.additional_info
+            additional_info=body.additional_info,
+            user_id=user.id
         )
         self._session.add(contact)
         await self._session.commit()
+        await self._invalidate(user)
         await self._session.refresh(contact)
         return contact
 
     async def update_contact(self, contact_id: int, body: ContactUpdate, user: User) -> Contact:
         try:
-            contact = await self.get_contact(contact_id, user)
-            print(contact)
+            contact = await self._get_contact_for_write(contact_id, user)
             if not contact:
                 return None
             update_data = body.dict(exclude_unset=True)
             for key, value in update_data.items():
                 setattr(contact, key, value)
+            if "phone" in update_data:
+                contact.phone_e164 = to_e164(contact.phone)
             await self._session.commit()
+            await self._invalidate(user)
             await self._session.refresh(contact)
             return contact
         except SQLAlchemyError as e:
             # Обробка помилок бази даних
-            print(f"Error occurred: {e}")
+            logger.exception("Contact update failed", extra={"contact_id": contact_id})
             raise
 
     async def delete_contact(self, contact_id: int, user: User) -> Contact:
         try:
-            contact = await self.get_contact(contact_id, user)
+            contact = await self._get_contact_for_write(contact_id, user)
             if not contact:
                 return None
             await self._session.delete(contact)
             await self._session.commit()
+            await self._invalidate(user)
             return contact
         except SQLAlchemyError as e:
             # Обробка помилок бази даних
-            print(f"Error occurred: {e}")
+            logger.exception("Contact delete failed", extra={"contact_id": contact_id})
             raise
+
+    async def merge_contacts(self, contact_id: int, duplicate_ids: List[int], user: User) -> Contact:
+        ids = {contact_id, *duplicate_ids}
+        # of=Contact: the joined user sits on the nullable side of an outer join.
+        stmt = select(Contact).where(Contact.id.in_(ids)).filter_by(user_id=user.id).with_for_update(of=Contact)
+        result = await self._session.execute(stmt)
+        contacts = {contact.id: contact for contact in result.scalars()}
+        if len(contacts) != len(ids):
+            await self._session.rollback()
+            return None
+        # The kept contact wins every field; the extras only add notes it lacks.
+        primary = contacts.pop(contact_id)
+        notes = [primary.additional_info] if primary.additional_info else []
+        for duplicate in sorted(contacts.values(), key=lambda c: c.id):
+            if duplicate.additional_info and duplicate.additional_info not in notes:
+                notes.append(duplicate.additional_info)
+            await self._session.delete(duplicate)
+        primary.additional_info = "\n".join(notes) or None
+        await self._session.commit()
+        await self._invalidate(user)
+        await self._session.refresh(primary)
+        return primary
+
+    async def delete_contacts_batch(self, user_id: int, limit: int) -> int:
+        # The LIMIT subquery bounds every statement, so each batch is a short
+        # transaction holding at most `limit` row locks, and nothing is loaded
+        # into the session.
+        batch = select(Contact.id).where(Contact.user_id == user_id).limit(limit)
+        stmt = delete(Contact).where(Contact.user_id == user_id, Contact.id.in_(batch))
+        result = await self._session.execute(stmt.execution_options(synchronize_session=False))
+        await self._session.commit()
+        return result.rowcount
+
     async def healthcheck(self):
         result = await self._session.execute(text("SELECT 1"))
         return result
\ No newline at end of file
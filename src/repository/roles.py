@@ -18,6 +18,9 @@ class RoleABC(ABC):
 
 
 class RoleDB(RoleABC):
+    # Roles are static reference data, so their ids are cached per process.
+    _role_ids: dict[str, int] = {}
+
     def __init__(self, session: AsyncSession) -> None:
         self._session = session
         pass
@@ -26,3 +29,16 @@ class RoleDB(RoleABC):
         query = select(Role).where(Role.name == rolename)
         result = await self._session.execute(query)
         return result.scalar_one_or_none()
+
+    async def load_role_ids(self):
+        result = await self._session.execute(select(Role))
+        for role in result.scalars():
+            self._role_ids[role.name] = role.id
+
+    async def get_role_id(self, rolename: RoleEnum) -> Optional[int]:
+        if rolename not in self._role_ids:
+            role = await self.get_role_by_name(rolename)
+            if role is None:
+                return None
+            self._role_ids[rolename] = role.id
+        return self._role_ids[rolename]
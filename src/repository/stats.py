@@ -0,0 +1,79 @@
+import time
+from abc import ABC, abstractmethod
+from datetime import date, datetime
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+VIEWS = ("mv_contacts_per_user", "mv_signups_per_day", "mv_upcoming_birthdays")
+
+
+class StatsABC(ABC):
+
+    @abstractmethod
+    async def get_contacts_per_user(self, offset: int, limit: int) -> List[dict]:
+        pass
+
+    @abstractmethod
+    async def get_signups_per_day(self, since: date) -> List[dict]:
+        pass
+
+    @abstractmethod
+    async def get_upcoming_birthdays(self, offset: int, limit: int) -> List[dict]:
+        pass
+
+    @abstractmethod
+    async def refreshed_at(self, view: str) -> Optional[datetime]:
+        pass
+
+    @abstractmethod
+    async def refresh(self, view: str) -> float:
+        pass
+
+
+class StatsDB(StatsABC):
+    # Reads only touch the materialized views; the aggregates over users and
+    # contacts run when the views are refreshed, not per request.
+    def __init__(self, session: AsyncSession) -> None:
+        self._session = session
+
+    async def _rows(self, sql: str, **params) -> List[dict]:
+        result = await self._session.execute(text(sql), params)
+        return [dict(row) for row in result.mappings()]
+
+    async def get_contacts_per_user(self, offset: int, limit: int) -> List[dict]:
+        return await self._rows("SELECT user_id, username, email, contacts, last_contact_at "
+                                "FROM mv_contacts_per_user ORDER BY contacts DESC, user_id "
+                                "OFFSET :offset LIMIT :limit", offset=offset, limit=limit)
+
+    async def get_signups_per_day(self, since: date) -> List[dict]:
+        return await self._rows("SELECT day, signups, confirmed FROM mv_signups_per_day "
+                                "WHERE day >= :since ORDER BY day", since=since)
+
+    async def get_upcoming_birthdays(self, offset: int, limit: int) -> List[dict]:
+        return await self._rows("SELECT user_id, next_7_days, next_30_days FROM mv_upcoming_birthdays "
+                                "ORDER BY next_7_days DESC, next_30_days DESC, user_id "
+                                "OFFSET :offset LIMIT :limit", offset=offset, limit=limit)
+
+    async def refreshed_at(self, view: str) -> Optional[datetime]:
+        result = await self._session.execute(
+            text("SELECT refreshed_at FROM materialized_view_refreshes WHERE view_name = :view"), {"view": view})
+        return result.scalar_one_or_none()
+
+    async def refresh(self, view: str) -> float:
+        if view not in VIEWS:
+            raise ValueError(f"Unknown materialized view {view}")
+        started = time.perf_counter()
+        # CONCURRENTLY keeps the old contents readable for the whole refresh.
+        await self._session.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view}"))
+        duration_ms = (time.perf_counter() - started) * 1000
+        # now() is the transaction start, i.e. the snapshot the view now reflects.
+        await self._session.execute(
+            text("INSERT INTO materialized_view_refreshes (view_name, refreshed_at, duration_ms) "
+                 "VALUES (:view, now(), :duration_ms) "
+                 "ON CONFLICT (view_name) DO UPDATE SET refreshed_at = excluded.refreshed_at, "
+                 "duration_ms = excluded.duration_ms"),
+            {"view": view, "duration_ms": duration_ms})
+        await self._session.commit()
+        return duration_ms
@@ -1,12 +1,12 @@
 from abc import ABC, abstractmethod
 
 from fastapi import HTTPException, status
-from libgravatar import Gravatar
-from sqlalchemy import select, func, text
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import delete, select, func, text, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.models import User
+from src.database.models import Contact, User
+from src.database.replicas import ReplicaRouter
 from src.repository.roles import RoleDB
 from src.schemas.roles import RoleEnum
 from src.schemas.users import UserModel
@@ -22,55 +22,84 @@ class UserABC(ABC):
     @abstractmethod
     async def get_user_by_email(self, email: str) :
         pass
+
     @abstractmethod
-    async def update_token(self, user: User, token: str):
+    async def delete_user(self, user_id: int, email: str):
         pass
 
 class UserDB(UserABC):
-    def __init__(self, session: AsyncSession) -> None:
+    def __init__(self, session: AsyncSession, replicas: ReplicaRouter | None = None) -> None:
         self._session = session
+        self._replicas = replicas
+
+    async def _pin(self, email: str):
+        if self._replicas:
+            await self._replicas.pin(f"email:{email}")
 
 
     async def create_user(self, body: UserModel):
-        user_role = await RoleDB(self._session).get_role_by_name(RoleEnum.user.value)
-        avatar = None
-        try:
-            g = Gravatar(body.email)
-            avatar = g.get_image()
-        except Exception as err:
-            print(err)
-        new_user = User(**body.model_dump(), avatar=avatar, role_id=user_role.id)
+        role_id = await RoleDB(self._session).get_role_id(RoleEnum.user.value)
+        new_user = User(**body.model_dump(), role_id=role_id)
         self._session.add(new_user)
-        await self._session.commit()
+        try:
+            await self._session.commit()
+        except IntegrityError:
+            await self._session.rollback()
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Account with this email already exists")
+        await self._pin(body.email)
         await self._session.refresh(new_user)
         return new_user
 
 
     async def get_user_by_email(self, email: str):
         stmt = select(User).where(User.email == email)
+        if self._replicas:
+            rows = await self._replicas.scalars(stmt, sticky_key=f"email:{email}")
+            if rows is not None:
+                return rows[0] if rows else None
         result = await self._session.execute(stmt)
         return result.scalar_one_or_none()
 
-
-    async def update_token(self, user: User, refresh_token: str | None):
-        user.refresh_token = refresh_token
-        await self._session.commit()
+    async def _get_user_for_write(self, email: str):
+        stmt = select(User).where(User.email == email)
+        result = await self._session.execute(stmt)
+        return result.scalar_one_or_none()
 
 
     async def confirmed_email(self, email: str):
-        user = await self.get_user_by_email(email)
+        user = await self._get_user_for_write(email)
         user.confirmed = True
         await self._session.commit()
+        await self._pin(email)
 
 
     async def update_avatar(self, email: str, url_avatar: str | None)-> User:
-        user = await self.get_user_by_email(email)
+        user = await self._get_user_for_write(email)
         user.avatar = url_avatar
         await self._session.commit()
+        await self._pin(email)
         return user
 
+    async def set_default_avatar(self, user_id: int, url_avatar: str):
+        # Only fills an empty avatar, so it never overwrites an uploaded one.
+        stmt = update(User).where(User.id == user_id, User.avatar.is_(None)).values(avatar=url_avatar)
+        await self._session.execute(stmt)
+        await self._session.commit()
+
     async def update_password(self, email: str, new_password: str):
-        user = await self.get_user_by_email(email)
+        user = await self._get_user_for_write(email)
         user.password = new_password
         await self._session.commit()
-        return user
\ No newline at end of file
+        await self._pin(email)
+        return user
+
+    async def delete_user(self, user_id: int, email: str):
+        # Bulk statements, not session.delete(): the ORM would load every
+        # contact through the backref first. Contacts added while the batches
+        # ran are removed in the same transaction as the user.
+        await self._session.execute(delete(Contact).where(Contact.user_id == user_id)
+                                    .execution_options(synchronize_session=False))
+        await self._session.execute(delete(User).where(User.id == user_id)
+                                    .execution_options(synchronize_session=False))
+        await self._session.commit()
+        await self._pin(email)
@@ -1,18 +1,34 @@
+import asyncio
+import logging
+from datetime import date
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Path, Query
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Response, WebSocket, WebSocketDisconnect, status
 from fastapi_limiter.depends import RateLimiter
+from pydantic import TypeAdapter
 
-from src.database.connect import Database
+from src.database.connect import database
 from src.database.models import User
 from src.repository.contacts import ContactDB
-from src.schemas.contacts import ContactsResponse, ContactCreate, ContactUpdate
+from src.repository.users import UserDB
+from src.schemas.contacts import ContactsResponse, ContactCreate, ContactUpdate, ContactMerge, DuplicatesResponse
 from src.schemas.roles import RoleEnum
 from src.services.auth import auth_service
+from src.services.birthdays import birthday_digest, upcoming_from
+from src.services.cache import contacts_cache
+from src.services.duplicates import duplicate_finder
+from src.services.idempotency import IdempotentRequest, idempotency
+from src.services.notifications import contact_events
+from src.services.phones import to_e164
 from src.services.roles import RoleAccess
 
 router = APIRouter()
-database = Database()
+logger = logging.getLogger(__name__)
+contacts_adapter = TypeAdapter(List[ContactsResponse])
+
+
+def dump_contacts(contacts) -> bytes:
+    return contacts_adapter.dump_json(contacts_adapter.validate_python(contacts, from_attributes=True))
 
 
 @router.get("/healthchecker", tags=["default"])
@@ -23,8 +39,8 @@ async def get_healthcheck(contact_db: ContactDB = Depends(database.get_contact_d
         if result is None:
             raise HTTPException(status_code=500, detail="Database is not configured correctly")
         return {"message": "Welcome to FastAPI. The API is up and running!"}
-    except Exception as e:
-        print(e)
+    except Exception:
+        logger.exception("Healthcheck failed")
         raise HTTPException(status_code=500, detail="Could not connect to the database")
 
 
@@ -33,62 +49,157 @@ async def read_contacts(limit: int = 100, offset: int = 0,
                         first_name: Optional[str] = Query(None),
                         last_name: Optional[str] = Query(None),
                         email: Optional[str] = Query(None),
+                        include_total: bool = Query(False, description="send the match count in X-Total-Count"),
                         contact_db: ContactDB = Depends(database.get_contact_db),
                         user: User = Depends(auth_service.get_current_user)):
-    contacts = await contact_db.get_contacts(offset=offset, limit=limit, first_name=first_name, last_name=last_name,
-                                             email=email, user=user)
-    return contacts
+    async def load():
+        contacts = await contact_db.get_contacts(offset=offset, limit=limit, first_name=first_name,
+                                                 last_name=last_name, email=email, user=user)
+        return dump_contacts(contacts)
+
+    async def load_total():
+        total = await contact_db.count_contacts(user, first_name=first_name, last_name=last_name, email=email)
+        return str(total).encode()
+
+    params = {"limit": limit, "offset": offset, "first_name": first_name, "last_name": last_name, "email": email}
+    content = await contacts_cache.get_or_set(user.id, "contacts", params, load)
+    headers = {}
+    if include_total:
+        # Cached like the pages, so a user's writes invalidate it too.
+        filters = {"first_name": first_name, "last_name": last_name, "email": email}
+        total = await contacts_cache.get_or_set(user.id, "contacts_count", filters, load_total)
+        headers = {"X-Total-Count": total.decode(), "X-Total-Count-Estimated": "false"}
+    return Response(content=content, media_type="application/json", headers=headers)
 
 
 @router.get("/contacts/all/",
             dependencies=[Depends(RoleAccess([RoleEnum.admin.value, RoleEnum.moderator.value]))],
             response_model=List[ContactsResponse],
             tags=["admin"])
-async def read_contacts(limit: int = 100, offset: int = 0,
+async def read_contacts(response: Response, limit: int = 100, offset: int = 0,
                         first_name: Optional[str] = Query(None),
                         last_name: Optional[str] = Query(None),
                         email: Optional[str] = Query(None),
+                        include_total: bool = Query(False, description="send an estimated count in X-Total-Count"),
                         contact_db: ContactDB = Depends(database.get_contact_db),):
     contacts = await contact_db.get_contacts_all(offset=offset,
                                                  limit=limit,
                                                  first_name=first_name,
                                                  last_name=last_name,
                                                  email=email)
+    if include_total:
+        total = await contact_db.estimate_contacts_all(first_name=first_name, last_name=last_name, email=email)
+        response.headers["X-Total-Count"] = str(total)
+        response.headers["X-Total-Count-Estimated"] = "true"
     return contacts
 
 
+# Declared before /contacts/{contact_id}, which would otherwise capture the path.
+@router.get("/contacts/duplicates", response_model=DuplicatesResponse,
+            dependencies=[Depends(RateLimiter(times=5, seconds=20))])
+async def read_duplicates(refresh: bool = Query(False, description="recompute instead of using the stored result"),
+                          contact_db: ContactDB = Depends(database.get_contact_db),
+                          user: User = Depends(auth_service.get_current_user)):
+    content = None if refresh else await duplicate_finder.get(user.id)
+    if content is None:
+        generation = await duplicate_finder.generation()
+        content = await duplicate_finder.store(user.id, await contact_db.get_contacts_by_user(user), generation)
+    return Response(content=content, media_type="application/json")
+
+
+@router.post("/contacts/merge", response_model=ContactsResponse,
+             dependencies=[Depends(idempotency), Depends(RateLimiter(times=5, seconds=20))])
+async def merge_contacts(body: ContactMerge, contact_db: ContactDB = Depends(database.get_contact_db),
+                         user: User = Depends(auth_service.get_current_user),
+                         idempotent: IdempotentRequest = Depends(idempotency)):
+    if body.contact_id in body.duplicate_ids:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="A contact cannot be merged into itself")
+    contact = await contact_db.merge_contacts(body.contact_id, body.duplicate_ids, user)
+    if contact is None:
+        raise HTTPException(status_code=404, detail="One or more contacts not found")
+    await contact_events.publish(user.id, contact_events.updated, contact)
+    for duplicate_id in set(body.duplicate_ids):
+        await contact_events.publish(user.id, contact_events.deleted, contact_id=duplicate_id)
+    return await idempotent.respond(ContactsResponse.model_validate(contact).model_dump_json())
+
+
 @router.get("/contacts/{contact_id}", response_model=ContactsResponse)
 async def read_contact(contact_id: int, contact_db: ContactDB = Depends(database.get_contact_db),
                        user: User = Depends(auth_service.get_current_user)):
-    contact = await contact_db.get_contact(contact_id, user)
-    if contact is None:
+    async def load():
+        contact = await contact_db.get_contact(contact_id, user)
+        if contact is None:
+            return None
+        return ContactsResponse.model_validate(contact).model_dump_json()
+
+    content = await contacts_cache.get_or_set(user.id, "contact", {"id": contact_id}, load)
+    if content is None:
         raise HTTPException(status_code=404, detail=f"Contact id = {contact_id} not found")
-    return contact
+    return Response(content=content, media_type="application/json")
+
+
+@router.get("/contacts/by-phone/{number}", response_model=List[ContactsResponse])
+async def read_contacts_by_phone(number: str, contact_db: ContactDB = Depends(database.get_contact_db),
+                                 user: User = Depends(auth_service.get_current_user)):
+    phone_e164 = to_e164(number)
+    if phone_e164 is None:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Not a valid phone number")
+
+    async def load():
+        return dump_contacts(await contact_db.get_contacts_by_phone(phone_e164, user))
+
+    content = await contacts_cache.get_or_set(user.id, "by_phone", {"phone": phone_e164}, load)
+    return Response(content=content, media_type="application/json")
 
 
 @router.get("/contacts/birthday/{days_number}", response_model=List[ContactsResponse])
 async def read_contacts_birthday(days_number: int = Path(ge=7),
                                  contact_db: ContactDB = Depends(database.get_contact_db),
                                  user: User = Depends(auth_service.get_current_user)):
-    contacts = await contact_db.get_contacts_birthday(days_number=days_number, user=user)
-    return contacts
+    async def load():
+        upcoming = await birthday_digest.get_upcoming(user.id, days_number)
+        if upcoming is None:
+            generation = await birthday_digest.generation()
+            members = await birthday_digest.store(user.id, await contact_db.get_contacts_by_user(user), generation)
+            upcoming = upcoming_from(members, days_number)
+        return b"[" + b",".join(upcoming) + b"]"
+
+    # The window depends on the current date, so it is part of the key.
+    params = {"days_number": days_number, "today": date.today().isoformat()}
+    content = await contacts_cache.get_or_set(user.id, "birthday", params, load)
+    return Response(content=content, media_type="application/json")
+
+
+@router.get("/contacts/cache/stats",
+            dependencies=[Depends(RoleAccess([RoleEnum.admin.value, RoleEnum.moderator.value]))],
+            tags=["admin"])
+async def read_contacts_cache_stats():
+    return await contacts_cache.stats()
 
 
-@router.post("/contacts", response_model=ContactsResponse, dependencies=[Depends(RateLimiter(times=5, seconds=20))])
+# Idempotency runs first so a retried request is answered from Redis
+# without spending rate-limit budget or reaching Postgres.
+@router.post("/contacts", response_model=ContactsResponse,
+             dependencies=[Depends(idempotency), Depends(RateLimiter(times=5, seconds=20))])
 async def create_contact(body: ContactCreate, contact_db: ContactDB = Depends(database.get_contact_db),
-                         user: User = Depends(auth_service.get_current_user)):
+                         user: User = Depends(auth_service.get_current_user),
+                         idempotent: IdempotentRequest = Depends(idempotency)):
     contact = await contact_db.create_contact(body=body, user=user)
-    return contact
+    await contact_events.publish(user.id, contact_events.created, contact)
+    return await idempotent.respond(ContactsResponse.model_validate(contact).model_dump_json())
 
 
-@router.put("/contacts/{contact_id}", dependencies=[Depends(RateLimiter(times=1, seconds=20))])
+@router.put("/contacts/{contact_id}", response_model=ContactsResponse,
+            dependencies=[Depends(idempotency), Depends(RateLimiter(times=1, seconds=20))])
 async def update_contact(body: ContactUpdate, contact_id: int = Path(ge=1),
                          contact_db: ContactDB = Depends(database.get_contact_db),
-                         user: User = Depends(auth_service.get_current_user)):
+                         user: User = Depends(auth_service.get_current_user),
+                         idempotent: IdempotentRequest = Depends(idempotency)):
     contact = await contact_db.update_contact(contact_id=contact_id, body=body, user=user)
     if contact is None:
         raise HTTPException(status_code=404, detail=f"Contact with id = {contact_id} not found")
-    return contact
+    await contact_events.publish(user.id, contact_events.updated, contact)
+    return await idempotent.respond(ContactsResponse.model_validate(contact).model_dump_json())
 
 
 @router.delete("/contacts/{contact_id}", status_code=204)
@@ -97,3 +208,36 @@ async def delete_contact(contact_id: int, contact_db: ContactDB = Depends(databa
     contact = await contact_db.delete_contact(contact_id=contact_id, user=user)
     if contact is None:
         raise HTTPException(status_code=404, detail=f"Contact with id={contact_id} not found")
+    await contact_events.publish(user.id, contact_events.deleted, contact_id=contact_id)
+
+
+@router.websocket("/contacts/stream")
+async def contacts_stream(websocket: WebSocket, token: str = Query(),
+                          user_db: UserDB = Depends(database.get_user_db)):
+    # Browsers cannot set the Authorization header on a WebSocket handshake,
+    # so the access token is passed as a query parameter instead.
+    try:
+        user = await auth_service.get_current_user(token=token, user_db=user_db)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+
+    async def forward_events():
+        async for event in contact_events.subscribe(user.id):
+            await websocket.send_text(event)
+
+    async def wait_disconnect():
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
+
+    tasks = [asyncio.create_task(forward_events()), asyncio.create_task(wait_disconnect())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
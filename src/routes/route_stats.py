@@ -0,0 +1,33 @@
+from datetime import date, timedelta
+
+from fastapi import APIRouter, Depends, Query
+
+from src.database.connect import database
+from src.repository.stats import StatsDB
+from src.schemas.roles import RoleEnum
+from src.schemas.stats import ContactsPerUserStats, SignupsPerDayStats, UpcomingBirthdaysStats
+from src.services.roles import RoleAccess
+
+router = APIRouter(prefix="/stats",
+                   dependencies=[Depends(RoleAccess([RoleEnum.admin.value, RoleEnum.moderator.value]))])
+
+
+@router.get("/contacts-per-user", response_model=ContactsPerUserStats)
+async def read_contacts_per_user(limit: int = Query(100, ge=1, le=1000), offset: int = Query(0, ge=0),
+                                 stats_db: StatsDB = Depends(database.get_stats_db)):
+    return {"refreshed_at": await stats_db.refreshed_at("mv_contacts_per_user"),
+            "items": await stats_db.get_contacts_per_user(offset=offset, limit=limit)}
+
+
+@router.get("/signups-per-day", response_model=SignupsPerDayStats)
+async def read_signups_per_day(days: int = Query(30, ge=1, le=366),
+                               stats_db: StatsDB = Depends(database.get_stats_db)):
+    return {"refreshed_at": await stats_db.refreshed_at("mv_signups_per_day"),
+            "items": await stats_db.get_signups_per_day(since=date.today() - timedelta(days=days))}
+
+
+@router.get("/upcoming-birthdays", response_model=UpcomingBirthdaysStats)
+async def read_upcoming_birthdays(limit: int = Query(100, ge=1, le=1000), offset: int = Query(0, ge=0),
+                                  stats_db: StatsDB = Depends(database.get_stats_db)):
+    return {"refreshed_at": await stats_db.refreshed_at("mv_upcoming_birthdays"),
+            "items": await stats_db.get_upcoming_birthdays(offset=offset, limit=limit)}
@@ -1,32 +1,36 @@
-import pickle
+import asyncio
+from functools import cache
 
-import cloudinary
-import cloudinary.uploader
-from fastapi import APIRouter, Depends, Request, Security, HTTPException, status, BackgroundTasks, UploadFile, File, \
-    Form
+from fastapi import APIRouter, Depends, Request, Response, Security, HTTPException, status, BackgroundTasks, \
+    UploadFile, File, Form
 from fastapi.security import OAuth2PasswordRequestForm, HTTPAuthorizationCredentials, HTTPBearer
 from fastapi_limiter.depends import RateLimiter
-from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse
 
-from src.config.config import settings
-from src.database.connect import Database
+from src.database.connect import database
 from src.database.models import User
+from src.repository.contacts import ContactDB
 from src.repository.users import UserDB
-from src.schemas.users import UserModel, UserResponse, TokenModel, RequestEmail
+from src.schemas.users import UserModel, UserResponse, TokenModel, RequestEmail, AccountDeletionResponse
+from src.services.account_deletion import account_deletion
 from src.services.auth import auth_service
+from src.services.avatars import avatar_pipeline
+from src.services.cache import invalidate_user_contacts
 from src.services.email import send_email, send_reset_password_email
+from src.services.gravatar import resolve_avatar
+from src.services.refresh_tokens import RefreshTokenError, refresh_tokens
+from src.services.tracing import tracer
 
-# Initialize templates
-templates = Jinja2Templates(directory="src/static/templates")
 
-router = APIRouter(prefix="/auth", tags=["auth"])
+@cache
+def get_templates():
+    # Jinja2 is only needed for the reset password page, so it loads on first use.
+    from fastapi.templating import Jinja2Templates
+
+    return Jinja2Templates(directory="src/static/templates")
+
 
-database = Database()
-cloudinary.config(cloud_name=settings.cloud_name,
-                  api_key=settings.api_key,
-                  api_secret=settings.api_secret,
-                  secure=True)
+router = APIRouter(prefix="/auth", tags=["auth"])
 
 get_refresh_token = HTTPBearer()
 
@@ -43,12 +47,11 @@ async def get_email_form_refresh_token(token: str):
 @router.post("/signup", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def signup(body: UserModel, background_tasks: BackgroundTasks, request: Request,
                  user_db: UserDB = Depends(database.get_user_db)):
-    exist_user = await user_db.get_user_by_email(email=body.email)
-    if exist_user:
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Account with this email already exists")
-    body.password = auth_service.get_password_hash(body.password)
+    # bcrypt is CPU bound; hashing in a thread keeps the event loop free.
+    body.password = await asyncio.to_thread(auth_service.get_password_hash, body.password)
     new_user = await user_db.create_user(body=body)
-    background_tasks.add_task(send_email, new_user.email, new_user.username, str(request.base_url))
+    background_tasks.add_task(resolve_avatar, user_db, new_user.id, new_user.email)
+    await send_email(new_user.email, new_user.username, str(request.base_url))
     return new_user
 
 
@@ -62,28 +65,53 @@ async def login(body: OAuth2PasswordRequestForm = Depends(), user_db: UserDB = D
     if not auth_service.verify_password(body.password, user.password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid password")
     # Generate JWT
-    access_token = await auth_service.create_access_token(data={"sub": user.email, "test": "RomboAPI"})
-    refresh_token = await auth_service.create_refresh_token(data={"sub": user.email})
-    await user_db.update_token(user, refresh_token)
+    with tracer.start_as_current_span("auth.issue_tokens"):
+        jti, family = await refresh_tokens.issue(user.email)
+        access_token = await auth_service.create_access_token(data={"sub": user.email, "test": "RomboAPI"})
+        refresh_token = await auth_service.create_refresh_token(data={"sub": user.email, "jti": jti, "fam": family})
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
 
 @router.get('/refresh_token')
-async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(get_refresh_token),
-                        user_db: UserDB = Depends(database.get_user_db)):
-    token = credentials.credentials
-    email = await auth_service.decode_refresh_token(token)
-    user = await user_db.get_user_by_email(email=email)
-    if user.refresh_token != token:
-        await user_db.update_token(user, None)
+async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(get_refresh_token)):
+    payload = await auth_service.decode_refresh_token(credentials.credentials)
+    email = payload["sub"]
+    try:
+        family = await refresh_tokens.rotate(payload.get("jti"), email)
+        jti, family = await refresh_tokens.issue(email, family)
+    except RefreshTokenError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
 
     access_token = await auth_service.create_access_token(data={"sub": email})
-    refresh_token = await auth_service.create_refresh_token(data={"sub": email})
-    await user_db.update_token(user, refresh_token)
+    refresh_token = await auth_service.create_refresh_token(data={"sub": email, "jti": jti, "fam": family})
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
 
+@router.post('/logout', status_code=status.HTTP_204_NO_CONTENT)
+async def logout(credentials: HTTPAuthorizationCredentials = Security(get_refresh_token)):
+    # Ends the session of this device only; other devices keep their tokens.
+    payload = await auth_service.decode_refresh_token(credentials.credentials)
+    await refresh_tokens.revoke(payload.get("jti"))
+
+
+@router.delete('/me', response_model=AccountDeletionResponse, status_code=status.HTTP_202_ACCEPTED)
+async def delete_account(request: Request, response: Response, user: User = Depends(auth_service.get_current_user),
+                         contact_db: ContactDB = Depends(database.get_contact_db)):
+    # The account and its contacts go in the background, batch by batch;
+    # the job id in Location needs no token, since the tokens are revoked.
+    job_id = await account_deletion.start(user, await contact_db.count_contacts(user))
+    response.headers["Location"] = str(request.url_for("read_account_deletion", job_id=job_id))
+    return await account_deletion.status(job_id)
+
+
+@router.get('/deletions/{job_id}', response_model=AccountDeletionResponse)
+async def read_account_deletion(job_id: str):
+    job = await account_deletion.status(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Deletion job not found")
+    return job
+
+
 @router.get('/confirmed_email/{token}')
 async def confirmed_email(token: str, user_db: UserDB = Depends(database.get_user_db)):
     email = await auth_service.get_email_from_token(token)
@@ -97,32 +125,31 @@ async def confirmed_email(token: str, user_db: UserDB = Depends(database.get_use
 
 
 @router.post('/request_email')
-async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, request: Request,
+async def request_email(body: RequestEmail, request: Request,
                         user_db: UserDB = Depends(database.get_user_db)):
     user = await user_db.get_user_by_email(body.email)
 
     if user.confirmed:
         return {"message": "Your email is already confirmed"}
     if user:
-        background_tasks.add_task(send_email, user.email, user.username, str(request.base_url))
+        await send_email(user.email, user.username, str(request.base_url))
     return {"message": "Check your email for confirmation."}
 
 
 @router.patch('/avatar', response_model=UserResponse, dependencies=[Depends(RateLimiter(times=3, seconds=20))])
 async def avatar(file: UploadFile = File(), user: User = Depends(auth_service.get_current_user),
                  user_db: UserDB = Depends(database.get_user_db)):
-    res = cloudinary.uploader.upload(file.file, public_id=user.email, overwrite=True)
-    res_url = cloudinary.CloudinaryImage(user.email).build_url(width=200, height=200, crop="fill",
-                                                               version=res.get("version"))
-    await user_db.update_avatar(user.email, res_url)
-    auth_service.cach.set(user.email, pickle.dumps(user))
-    auth_service.cach.expire(user.email, time=300)
+    url = await avatar_pipeline.upload(user.email, file)
+    user = await user_db.update_avatar(user.email, url)
+    # Drop the cached principal and contacts so the next request loads the new avatar.
+    await auth_service.cach.delete(user.email)
+    await invalidate_user_contacts(user.id)
     return user
 
 
 @router.get("/reset_password/{token}", response_class=HTMLResponse)
 async def reset_password_form(request: Request, token: str):
-    return templates.TemplateResponse("reset_password.html", {"request": request, "token": token})
+    return get_templates().TemplateResponse("reset_password.html", {"request": request, "token": token})
 
 @router.post("/reset_password")
 async def reset_password(token: str = Form(...), newPassword: str = Form(...), confirmPassword: str = Form(...), user_db: UserDB = Depends(database.get_user_db)):
@@ -139,10 +166,10 @@ async def reset_password(token: str = Form(...), newPassword: str = Form(...), c
     return {"message": "Password successfully reset."}
 
 @router.post("/request_reset_password")
-async def request_reset_password(body: RequestEmail, background_tasks: BackgroundTasks, request: Request,
+async def request_reset_password(body: RequestEmail, request: Request,
                                  user_db: UserDB = Depends(database.get_user_db)):
     user = await user_db.get_user_by_email(body.email)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    background_tasks.add_task(send_reset_password_email, user.email, user.username, str(request.base_url))
+    await send_reset_password_email(user.email, user.username, str(request.base_url))
     return {"message": "Check your email for reset password link."}
\ No newline at end of file
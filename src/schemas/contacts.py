@@ -1,7 +1,7 @@
-from datetime import date
-from typing import Optional
+from datetime import date, datetime
+from typing import List, Optional
 
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 
 from src.schemas.users import UserResponse
 
@@ -21,6 +21,7 @@ class ContactCreate(ContactsBase):
 
 class ContactsResponse(ContactsBase):
     id: int
+    phone_e164: str | None = None
     user: UserResponse | None
 
     class Config:
@@ -34,3 +35,18 @@ class ContactUpdate(ContactsBase):
     phone: Optional[str] = None
     birthday: Optional[date] = None
     additional_info: Optional[str] = None
+
+
+class ContactMerge(BaseModel):
+    contact_id: int
+    duplicate_ids: List[int] = Field(min_length=1, max_length=100)
+
+
+class DuplicateGroup(BaseModel):
+    reasons: List[str]
+    contacts: List[ContactsResponse]
+
+
+class DuplicatesResponse(BaseModel):
+    computed_at: datetime
+    groups: List[DuplicateGroup]
@@ -0,0 +1,39 @@
+from datetime import date, datetime
+from typing import List
+
+from pydantic import BaseModel
+
+
+class ContactsPerUser(BaseModel):
+    user_id: int
+    username: str
+    email: str
+    contacts: int
+    last_contact_at: datetime | None
+
+
+class SignupsPerDay(BaseModel):
+    day: date
+    signups: int
+    confirmed: int
+
+
+class UpcomingBirthdays(BaseModel):
+    user_id: int
+    next_7_days: int
+    next_30_days: int
+
+
+class ContactsPerUserStats(BaseModel):
+    refreshed_at: datetime | None
+    items: List[ContactsPerUser]
+
+
+class SignupsPerDayStats(BaseModel):
+    refreshed_at: datetime | None
+    items: List[SignupsPerDay]
+
+
+class UpcomingBirthdaysStats(BaseModel):
+    refreshed_at: datetime | None
+    items: List[UpcomingBirthdays]
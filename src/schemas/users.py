@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from pydantic import BaseModel, EmailStr, Field
 
 from src.schemas.roles import RoleBase
@@ -13,7 +15,7 @@ class UserResponse(BaseModel):
     id: int
     username: str
     email: str
-    avatar: str
+    avatar: str | None
     role: RoleBase | None
 
     class Config:
@@ -27,4 +29,14 @@ class TokenModel(BaseModel):
 
 
 class RequestEmail(BaseModel):
-    email: EmailStr
\ No newline at end of file
+    email: EmailStr
+
+
+class AccountDeletionResponse(BaseModel):
+    job_id: str
+    status: str
+    contacts_total: int
+    contacts_deleted: int
+    started_at: datetime
+    updated_at: datetime
+    finished_at: datetime | None = None
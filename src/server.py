@@ -0,0 +1,84 @@
+# Production launcher.
+#
+#   python -m src.server --workers 4 --db-connection-budget 80
+#
+# Runs main:app under uvicorn with uvloop and httptools. With more than one
+# worker, uvicorn's supervisor forks the processes and restarts any that die.
+# --db-connection-budget is the number of Postgres connections the whole
+# deployment may hold. Each worker gets an equal share as a fixed pool with no
+# overflow, so adding workers never pushes the server past max_connections.
+# SIGTERM stops accepting connections, lets in-flight requests finish for up
+# to --graceful-timeout seconds, then runs the lifespan shutdown.
+import argparse
+import os
+import shutil
+import tempfile
+
+import uvicorn
+
+
+def pool_size(budget: int, workers: int) -> int:
+    size = budget // workers
+    if size < 1:
+        raise SystemExit(f"a budget of {budget} connections cannot serve {workers} workers")
+    return size
+
+
+def prepare_metrics_dir(workers: int):
+    # Each worker writes its samples to files here; stale files from a
+    # previous run would be merged into the new totals.
+    if workers < 2:
+        return
+    directory = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR",
+                                      os.path.join(tempfile.gettempdir(), "contacts-prometheus"))
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the API in production mode")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--db-connection-budget", type=int,
+                        help="Postgres connections for all workers together; default keeps DB_POOL_SIZE")
+    parser.add_argument("--keep-alive", type=int, default=5, help="idle keep-alive timeout, seconds")
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--limit-concurrency", type=int,
+                        help="per worker; beyond it new connections get 503 instead of queueing")
+    parser.add_argument("--graceful-timeout", type=int, default=30, help="seconds to drain on SIGTERM")
+    parser.add_argument("--forwarded-allow-ips", default="127.0.0.1",
+                        help="proxies trusted for X-Forwarded-For")
+    args = parser.parse_args()
+
+    if args.db_connection_budget is not None:
+        # Settings are read from the environment on first import, which must
+        # come after this: with one worker uvicorn imports main in this very
+        # process, with more each worker process builds its own Settings.
+        size = pool_size(args.db_connection_budget, args.workers)
+        os.environ["DB_POOL_SIZE"] = str(size)
+        os.environ["DB_MAX_OVERFLOW"] = "0"
+    from src.config.config import settings
+
+    size = settings.db_pool_size
+    prepare_metrics_dir(args.workers)
+    print(f"{args.workers} workers, {size} Postgres connections each "
+          f"({args.workers * size} total, plus as many per replica)")
+
+    uvicorn.run("main:app",
+                host=args.host,
+                port=args.port,
+                workers=args.workers,
+                loop="uvloop",
+                http="httptools",
+                backlog=args.backlog,
+                timeout_keep_alive=args.keep_alive,
+                limit_concurrency=args.limit_concurrency,
+                timeout_graceful_shutdown=args.graceful_timeout,
+                proxy_headers=True,
+                forwarded_allow_ips=args.forwarded_allow_ips,
+                access_log=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+
+import redis.asyncio as redis
+
+from src.config.config import settings
+from src.database.connect import database
+from src.database.models import User
+from src.database.redis_client import redis_client
+from src.repository.contacts import ContactDB
+from src.repository.users import UserDB
+from src.services.auth import auth_service
+from src.services.birthdays import birthday_digest
+from src.services.cache import contacts_cache
+from src.services.duplicates import duplicate_finder
+from src.services.refresh_tokens import refresh_tokens
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_KEY = "account_deletion:active"
+
+
+def now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class AccountDeletion:
+    # Progress lives in Redis, so any worker can report it and a job cut
+    # short by a restart is picked up again by resume().
+    def __init__(self, client: redis.Redis, batch_size: int, pause: float, lock_timeout: int, ttl: int) -> None:
+        self._redis = client
+        self._batch_size = batch_size
+        self._pause = pause
+        self._lock_timeout = lock_timeout
+        self._ttl = ttl
+        self._tasks: set[asyncio.Task] = set()
+
+    @staticmethod
+    def _job_key(job_id: str) -> str:
+        return f"account_deletion:job:{job_id}"
+
+    @staticmethod
+    def _user_key(user_id: int) -> str:
+        return f"account_deletion:user:{user_id}"
+
+    @staticmethod
+    def _lock_key(job_id: str) -> str:
+        return f"account_deletion:lock:{job_id}"
+
+    async def start(self, user: User, contacts_total: int) -> str:
+        job_id = uuid.uuid4().hex
+        # A repeated request returns the job that is already running. The
+        # key can expire between SET NX and GET; then the SET is tried again.
+        while not await self._redis.set(self._user_key(user.id), job_id, nx=True, ex=self._ttl):
+            existing = await self._redis.get(self._user_key(user.id))
+            if existing is not None:
+                return existing.decode()
+        started = now()
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self._job_key(job_id), mapping={
+                "job_id": job_id, "user_id": user.id, "email": user.email, "status": "pending",
+                "contacts_total": contacts_total, "contacts_deleted": 0,
+                "started_at": started, "updated_at": started,
+            })
+            pipe.expire(self._job_key(job_id), self._ttl)
+            pipe.sadd(ACTIVE_KEY, job_id)
+            await pipe.execute()
+        self._spawn(job_id)
+        return job_id
+
+    def _spawn(self, job_id: str):
+        # The loop only keeps weak references to tasks.
+        task = asyncio.create_task(self.run(job_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def status(self, job_id: str) -> Optional[dict]:
+        raw = await self._redis.hgetall(self._job_key(job_id))
+        return {key.decode(): value.decode() for key, value in raw.items()} or None
+
+    async def _update(self, job_id: str, **fields):
+        await self._redis.hset(self._job_key(job_id), mapping={**fields, "updated_at": now()})
+
+    async def run(self, job_id: str):
+        # The lock expires unless each batch renews it, so a job whose worker
+        # died becomes free for resume() to take over.
+        lock_key = self._lock_key(job_id)
+        if not await self._redis.set(lock_key, 1, nx=True, ex=self._lock_timeout):
+            return
+        try:
+            job = await self.status(job_id)
+            if job is None or job["status"] == "done":
+                await self._redis.srem(ACTIVE_KEY, job_id)
+                return
+            user_id, email = int(job["user_id"]), job["email"]
+            # Sign the user out everywhere before the data goes away.
+            await refresh_tokens.revoke_user(email)
+            await auth_service.cach.delete(email)
+            await self._update(job_id, status="running")
+
+            while True:
+                async with database.get_session() as session:
+                    deleted = await ContactDB(session).delete_contacts_batch(user_id, self._batch_size)
+                await self._redis.hincrby(self._job_key(job_id), "contacts_deleted", deleted)
+                await self._update(job_id, status="running")
+                await self._redis.expire(lock_key, self._lock_timeout)
+                if deleted < self._batch_size:
+                    break
+                # Gives replication and concurrent requests room between batches.
+                await asyncio.sleep(self._pause)
+
+            async with database.get_session() as session:
+                await UserDB(session).delete_user(user_id, email)
+            await auth_service.cach.delete(email)
+            await contacts_cache.invalidate(user_id)
+            await birthday_digest.invalidate(user_id)
+            await duplicate_finder.invalidate(user_id)
+            await self._update(job_id, status="done", finished_at=now())
+            await self._redis.srem(ACTIVE_KEY, job_id)
+            logger.info("Account deleted", extra={"user_id": user_id, "job_id": job_id})
+        except Exception:
+            logger.exception("Account deletion failed", extra={"job_id": job_id})
+            await self._update(job_id, status="failed")
+        finally:
+            await self._redis.delete(lock_key)
+
+    async def resume(self):
+        # Failed jobs and jobs orphaned by a restart stay in the active set.
+        for job_id in await self._redis.smembers(ACTIVE_KEY):
+            job_id = job_id.decode()
+            if not await self._redis.exists(self._lock_key(job_id)):
+                self._spawn(job_id)
+
+
+account_deletion = AccountDeletion(redis_client,
+                                   batch_size=settings.account_deletion_batch_size,
+                                   pause=settings.account_deletion_pause,
+                                   lock_timeout=settings.account_deletion_lock_timeout,
+                                   ttl=settings.account_deletion_ttl)
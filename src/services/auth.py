@@ -1,34 +1,31 @@
 from datetime import datetime, timedelta
 from typing import Optional
 
-import redis
 import pickle
 from fastapi import Depends, HTTPException, status
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 
-from src import database
 from src.config.config import settings
-from src.database.connect import Database
+from src.database.connect import database
 from src.database.models import User
-
-database = Database()
+from src.database.redis_client import redis_client
+from src.repository.users import UserDB
+from src.services.tracing import tracer
 
 
 class Auth:
     pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-    cach = redis.Redis(host=settings.redis_host,
-                       port=settings.redis_port,
-                       db=0,
-                       password=settings.redis_password
-                       )
+    cach = redis_client
 
     def verify_password(self, plain_password, hashed_password):
-        return self.pwd_context.verify(plain_password, hashed_password)
+        with tracer.start_as_current_span("bcrypt.verify"):
+            return self.pwd_context.verify(plain_password, hashed_password)
 
     def get_password_hash(self, password: str):
-        return self.pwd_context.hash(password)
+        with tracer.start_as_current_span("bcrypt.hash"):
+            return self.pwd_context.hash(password)
 
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
@@ -47,23 +44,22 @@ class Auth:
         if expires_delta:
             expire = datetime.utcnow() + timedelta(seconds=expires_delta)
         else:
-            expire = datetime.utcnow() + timedelta(days=7)
+            expire = datetime.utcnow() + timedelta(seconds=settings.refresh_token_ttl)
         to_encode.update({"iat": datetime.utcnow(), "exp": expire, "scope": "refresh_token"})
         encoded_refresh_token = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
         return encoded_refresh_token
 
-    async def decode_refresh_token(self, refresh_token: str):
+    async def decode_refresh_token(self, refresh_token: str) -> dict:
         try:
             payload = jwt.decode(refresh_token, settings.secret_key, algorithms=[settings.algorithm])
             if payload['scope'] == 'refresh_token':
-                email = payload['sub']
-                return email
+                return payload
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid scope for token')
         except JWTError:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate credentials')
 
     async def get_current_user(self, token: str = Depends(oauth2_scheme),
-                               user_db: Database = Depends(database.get_user_db)):
+                               user_db: UserDB = Depends(database.get_user_db)):
         credentials_exception = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
@@ -82,13 +78,12 @@ class Auth:
         except JWTError as e:
             raise credentials_exception
         user_cach = str(email)
-        user = self.cach.get(user_cach)
+        user = await self.cach.get(user_cach)
         if user is None:
             user = await user_db.get_user_by_email(email=email)
             if user is None:
                 raise credentials_exception
-            self.cach.set(user_cach, pickle.dumps(user))
-            self.cach.expire(user_cach, time=300)
+            await self.cach.set(user_cach, pickle.dumps(user), ex=300)
         else:
             user = pickle.loads(user)
         return user
@@ -0,0 +1,124 @@
+import asyncio
+import hashlib
+import io
+import multiprocessing
+import os
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from fastapi import HTTPException, UploadFile, status
+
+from src.config.config import settings
+
+ALLOWED_FORMATS = {"JPEG", "PNG", "WEBP", "GIF"}
+CHUNK_SIZE = 64 * 1024
+
+
+def resize_avatar(data: bytes, size: int, max_pixels: int) -> bytes:
+    # Runs in a worker process: decoding and resampling are CPU bound.
+    from PIL import Image, ImageOps
+
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    with Image.open(io.BytesIO(data)) as image:
+        if image.format not in ALLOWED_FORMATS:
+            raise ValueError(f"Unsupported image format {image.format}")
+        image = ImageOps.exif_transpose(image)
+        image = ImageOps.fit(image.convert("RGBA"), (size, size), Image.Resampling.LANCZOS)
+        output = io.BytesIO()
+        image.save(output, format="PNG", optimize=True)
+        return output.getvalue()
+
+
+class AvatarStorage(ABC):
+
+    @abstractmethod
+    async def save(self, name: str, data: bytes) -> str:
+        pass
+
+
+class CloudinaryStorage(AvatarStorage):
+    # The SDK is imported and configured on the first upload, not at startup.
+    def __init__(self) -> None:
+        self._configured = False
+
+    async def save(self, name: str, data: bytes) -> str:
+        import cloudinary
+        import cloudinary.uploader
+
+        if not self._configured:
+            cloudinary.config(cloud_name=settings.cloud_name,
+                              api_key=settings.api_key,
+                              api_secret=settings.api_secret,
+                              secure=True)
+            self._configured = True
+        # The SDK is synchronous, so the upload runs in a thread.
+        res = await asyncio.to_thread(cloudinary.uploader.upload, data, public_id=name, overwrite=True)
+        return cloudinary.CloudinaryImage(name).build_url(version=res.get("version"))
+
+
+class LocalStorage(AvatarStorage):
+    def __init__(self, directory: str, base_url: str) -> None:
+        self._directory = Path(directory)
+        self._base_url = base_url.rstrip("/")
+
+    def _write(self, filename: str, data: bytes):
+        self._directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._directory / f".{filename}.tmp"
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, self._directory / filename)
+
+    async def save(self, name: str, data: bytes) -> str:
+        filename = f"{hashlib.sha256(name.encode()).hexdigest()}.png"
+        await asyncio.to_thread(self._write, filename, data)
+        return f"{self._base_url}/{filename}?v={int(time.time())}"
+
+
+class AvatarPipeline:
+    def __init__(self, storage: AvatarStorage, size: int, max_bytes: int, workers: int) -> None:
+        self._storage = storage
+        self._size = size
+        self._max_bytes = max_bytes
+        self._workers = workers
+        self._executor: ProcessPoolExecutor | None = None
+
+    async def read(self, file: UploadFile) -> bytes:
+        chunks, total = [], 0
+        while chunk := await file.read(CHUNK_SIZE):
+            total += len(chunk)
+            if total > self._max_bytes:
+                raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                                    detail=f"Avatar must be at most {self._max_bytes} bytes")
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    async def resize(self, data: bytes) -> bytes:
+        from PIL import Image, UnidentifiedImageError
+
+        if self._executor is None:
+            # Spawned, not forked: the web worker already runs threads, and a
+            # forked child can inherit one of their locks held forever.
+            self._executor = ProcessPoolExecutor(max_workers=self._workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._executor, resize_avatar, data, self._size, 50_000_000)
+        except (UnidentifiedImageError, Image.DecompressionBombError, ValueError, OSError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid image")
+
+    async def upload(self, name: str, file: UploadFile) -> str:
+        data = await self.read(file)
+        return await self._storage.save(name, await self.resize(data))
+
+
+def get_storage() -> AvatarStorage:
+    if settings.avatar_storage == "local":
+        return LocalStorage(settings.avatar_local_dir, settings.avatar_local_url)
+    return CloudinaryStorage()
+
+
+avatar_pipeline = AvatarPipeline(get_storage(),
+                                 size=settings.avatar_size,
+                                 max_bytes=settings.avatar_max_bytes,
+                                 workers=settings.avatar_workers)
@@ -0,0 +1,144 @@
+import asyncio
+from datetime import date, timedelta
+from typing import AsyncContextManager, Awaitable, Callable, Iterable, List, Optional
+
+import redis.asyncio as redis
+from redis.exceptions import WatchError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config.config import settings
+from src.database.models import Contact, User
+from src.database.redis_client import redis_client
+from src.schemas.contacts import ContactsResponse
+
+# Scores are days of a leap year, so 29 February gets its own slot.
+LEAP_YEAR = 2000
+DAYS_IN_YEAR = 366
+CLOCK_KEY = "birthdays:clock"
+
+
+def day_of_year(day: date) -> int:
+    return date(LEAP_YEAR, day.month, day.day).timetuple().tm_yday
+
+
+def day_ranges(days_number: int, today: date) -> List[tuple]:
+    start = day_of_year(today)
+    end = day_of_year(today + timedelta(days=days_number))
+    if days_number >= DAYS_IN_YEAR - 1:
+        return [(start, DAYS_IN_YEAR), (1, start - 1)]
+    if end >= start:
+        return [(start, end)]
+    return [(start, DAYS_IN_YEAR), (1, end)]
+
+
+def upcoming_from(members: dict, days_number: int, today: date | None = None) -> List[bytes]:
+    # Same order as ZRANGEBYSCORE: by day, then by member.
+    ranked = sorted((score, member.encode()) for member, score in members.items() if member)
+    return [member for low, high in day_ranges(days_number, today or date.today())
+            for score, member in ranked if low <= score <= high]
+
+
+def digest_members(contacts: List[Contact]) -> dict:
+    # The empty member scored 0 marks the set as built even for users
+    # without contacts; ranges always start at day 1 and never return it.
+    members = {"": 0}
+    for contact in contacts:
+        if contact.birthday is not None:
+            members[ContactsResponse.model_validate(contact).model_dump_json()] = day_of_year(contact.birthday)
+    return members
+
+
+class BirthdayDigest:
+    def __init__(self, client: redis.Redis, ttl: int) -> None:
+        self._redis = client
+        self._ttl = ttl
+
+    @staticmethod
+    def _key(user_id: int) -> str:
+        return f"birthdays:{user_id}"
+
+    @staticmethod
+    def _generation_key(user_id: int) -> str:
+        return f"birthdays:gen:{user_id}"
+
+    async def generation(self) -> int:
+        # Read before loading contacts and handed to store(): a write that
+        # invalidates in between stamps the user with a later generation.
+        return int(await self._redis.get(CLOCK_KEY) or 0)
+
+    async def store(self, user_id: int, contacts: Iterable[Contact], generation: int) -> dict:
+        # Serializing a large address book is CPU bound; in a thread it
+        # cannot hold up the requests on this event loop.
+        members = await asyncio.to_thread(digest_members, list(contacts))
+        key = self._key(user_id)
+        generation_key = self._generation_key(user_id)
+        # Build under a temporary key and swap it in, so readers never see a
+        # half-written set. Contacts read before the last invalidation are
+        # not stored: renaming them into place would bring back stale data.
+        tmp_key = f"{key}:building"
+        async with self._redis.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(generation_key)
+                if int(await pipe.get(generation_key) or 0) > generation:
+                    return members
+                pipe.multi()
+                pipe.delete(tmp_key)
+                pipe.zadd(tmp_key, members)
+                pipe.expire(tmp_key, self._ttl)
+                pipe.rename(tmp_key, key)
+                await pipe.execute()
+            except WatchError:
+                pass
+        return members
+
+    async def get_upcoming(self, user_id: int, days_number: int, today: date | None = None) -> Optional[List[bytes]]:
+        key = self._key(user_id)
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.exists(key)
+            for low, high in day_ranges(days_number, today or date.today()):
+                pipe.zrangebyscore(key, low, high)
+            exists, *ranges = await pipe.execute()
+        if not exists:
+            return None
+        return [member for members in ranges for member in members]
+
+    async def invalidate(self, user_id: int):
+        generation = await self._redis.incr(CLOCK_KEY)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.set(self._generation_key(user_id), generation, ex=self._ttl)
+            pipe.delete(self._key(user_id))
+            await pipe.execute()
+
+    async def refresh_all(self, sessions: Callable[[], AsyncContextManager[AsyncSession]],
+                          on_user: Callable[[User, List[bytes]], Awaitable[None]] | None = None,
+                          page_size: int = 500):
+        # Short sessions for each page of owners and each user, so no
+        # transaction stays open while the whole table is walked, and the
+        # digest emails are queued with no transaction open at all.
+        last_user_id = 0
+        while True:
+            async with sessions() as session:
+                stmt = (select(Contact.user_id).where(Contact.user_id > last_user_id)
+                        .group_by(Contact.user_id).order_by(Contact.user_id).limit(page_size))
+                owners = (await session.scalars(stmt)).all()
+            if not owners:
+                return
+            for user_id in owners:
+                generation = await self.generation()
+                async with sessions() as session:
+                    contacts = (await session.scalars(select(Contact).where(Contact.user_id == user_id))).all()
+                if contacts:
+                    await self._refresh_user(contacts, generation, on_user)
+            last_user_id = owners[-1]
+
+    async def _refresh_user(self, contacts: List[Contact], generation: int, on_user):
+        user = contacts[0].user
+        members = await self.store(user.id, contacts, generation)
+        if on_user is not None:
+            upcoming = upcoming_from(members, settings.birthday_digest_days)
+            if upcoming:
+                await on_user(user, upcoming)
+
+
+birthday_digest = BirthdayDigest(redis_client, ttl=settings.birthday_digest_ttl)
@@ -0,0 +1,112 @@
+import asyncio
+from typing import Awaitable, Callable, Optional
+from urllib.parse import urlencode
+
+import redis.asyncio as redis
+
+from src.config.config import settings
+from src.database.redis_client import redis_client
+from src.services.birthdays import birthday_digest
+from src.services.duplicates import duplicate_finder
+
+
+class ResponseCache:
+    def __init__(self, client: redis.Redis, prefix: str, ttl: int, lock_timeout: int) -> None:
+        self._redis = client
+        self._prefix = prefix
+        self._ttl = ttl
+        self._lock_timeout = lock_timeout
+        # key -> [lock, coroutines holding or waiting for it]
+        self._locks: dict[str, list] = {}
+
+    def _generation_key(self, user_id: int) -> str:
+        return f"{self._prefix}:gen:{user_id}"
+
+    @property
+    def _stats_key(self) -> str:
+        return f"{self._prefix}:stats"
+
+    async def _key(self, user_id: int, endpoint: str, params: dict) -> str:
+        generation = await self._redis.get(self._generation_key(user_id))
+        query = urlencode(sorted((k, str(v)) for k, v in params.items() if v is not None))
+        return f"{self._prefix}:{user_id}:{int(generation or 0)}:{endpoint}:{query}"
+
+    async def _record(self, field: str):
+        await self._redis.hincrby(self._stats_key, field, 1)
+
+    async def get_or_set(self, user_id: int, endpoint: str, params: dict,
+                         loader: Callable[[], Awaitable[Optional[bytes]]]) -> Optional[bytes]:
+        key = await self._key(user_id, endpoint, params)
+        cached = await self._redis.get(key)
+        if cached is not None:
+            await self._record("hits")
+            return cached
+
+        # Single flight: one coroutine per worker, and one worker per key
+        # across the deployment, rebuilds a missing entry; the rest wait for it.
+        entry = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                cached = await self._redis.get(key)
+                if cached is not None:
+                    await self._record("hits")
+                    return cached
+                lock_key = f"{key}:lock"
+                acquired = await self._redis.set(lock_key, 1, nx=True, ex=self._lock_timeout)
+                if not acquired:
+                    cached = await self._wait_for(key)
+                    if cached is not None:
+                        await self._record("hits")
+                        return cached
+                try:
+                    await self._record("misses")
+                    value = await loader()
+                    if value is not None:
+                        await self._redis.set(key, value, ex=self._ttl)
+                    return value
+                finally:
+                    if acquired:
+                        await self._redis.delete(lock_key)
+        finally:
+            # Dropped only once nobody is queued on it, or a newcomer would
+            # get a fresh lock and load in parallel with the waiters.
+            entry[1] -= 1
+            if not entry[1]:
+                self._locks.pop(key, None)
+
+    async def _wait_for(self, key: str) -> Optional[bytes]:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self._lock_timeout
+        while loop.time() < deadline:
+            await asyncio.sleep(0.05)
+            cached = await self._redis.get(key)
+            if cached is not None:
+                return cached
+        return None
+
+    async def invalidate(self, user_id: int):
+        # Bumping the generation orphans every cached entry of the user at
+        # once; orphaned keys simply expire with their TTL.
+        await self._redis.incr(self._generation_key(user_id))
+
+    async def stats(self) -> dict:
+        raw = await self._redis.hgetall(self._stats_key)
+        stats = {key.decode(): int(value) for key, value in raw.items()}
+        hits, misses = stats.get("hits", 0), stats.get("misses", 0)
+        total = hits + misses
+        return {"hits": hits, "misses": misses, "hit_ratio": hits / total if total else 0.0}
+
+
+contacts_cache = ResponseCache(redis_client,
+                               prefix="cache:contacts",
+                               ttl=settings.contacts_cache_ttl,
+                               lock_timeout=settings.contacts_cache_lock_timeout)
+
+
+async def invalidate_user_contacts(user_id: int):
+    # Every cached contact embeds its owner, avatar included, so a change to
+    # the user must drop these as well as the contact writes do.
+    await contacts_cache.invalidate(user_id)
+    await birthday_digest.invalidate(user_id)
+    await duplicate_finder.invalidate(user_id)
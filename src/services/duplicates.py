@@ -0,0 +1,178 @@
+import asyncio
+import json
+from collections import defaultdict
+from datetime import datetime, timezone
+from itertools import combinations
+from typing import AsyncContextManager, Callable, Iterable, List, Optional
+
+import redis.asyncio as redis
+from redis.exceptions import WatchError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config.config import settings
+from src.database.models import Contact
+from src.database.redis_client import redis_client
+from src.schemas.contacts import ContactsResponse
+from src.services.phones import to_e164
+
+# A trigram shared by more names than this says little about any pair of
+# them, and comparing every pair inside it is what blocking is meant to avoid.
+MAX_TRIGRAM_BLOCK = 50
+CLOCK_KEY = "duplicates:clock"
+
+
+def normalize_email(email: str) -> str:
+    local, _, domain = email.strip().lower().partition("@")
+    return f"{local.split('+', 1)[0]}@{domain}"
+
+
+def normalize_name(first_name: str, last_name: str) -> str:
+    # Sorted words also catch swapped first and last names.
+    return " ".join(sorted(f"{first_name} {last_name}".lower().split()))
+
+
+def trigrams(text: str) -> set:
+    # Same padding as pg_trgm: two spaces before each word, one after.
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class UnionFind:
+    def __init__(self, size: int) -> None:
+        self._parent = list(range(size))
+
+    def find(self, item: int) -> int:
+        while self._parent[item] != item:
+            self._parent[item] = self._parent[self._parent[item]]
+            item = self._parent[item]
+        return item
+
+    def union(self, a: int, b: int):
+        self._parent[self.find(a)] = self.find(b)
+
+
+def find_duplicate_groups(contacts: List[Contact], name_similarity: float) -> List[tuple]:
+    # Candidates only come from shared blocking keys, so the work grows with
+    # the block sizes rather than with every pair of contacts.
+    edges = []
+    exact_keys = (("email", lambda c: normalize_email(c.email)),
+                  ("phone", lambda c: c.phone_e164 or to_e164(c.phone)),
+                  ("name", lambda c: normalize_name(c.first_name, c.last_name)))
+    for reason, key in exact_keys:
+        blocks = defaultdict(list)
+        for index, contact in enumerate(contacts):
+            value = key(contact)
+            if value:
+                blocks[value].append(index)
+        edges.extend((members[0], other, reason) for members in blocks.values() for other in members[1:])
+
+    grams = [trigrams(normalize_name(c.first_name, c.last_name)) for c in contacts]
+    postings = defaultdict(list)
+    for index, contact_grams in enumerate(grams):
+        for gram in contact_grams:
+            postings[gram].append(index)
+    # Rare trigrams only pick the candidate pairs; the score uses every
+    # trigram, or common ones would drag real duplicates below the threshold.
+    candidates = set()
+    for members in postings.values():
+        if len(members) <= MAX_TRIGRAM_BLOCK:
+            candidates.update(combinations(members, 2))
+    for a, b in candidates:
+        common = len(grams[a] & grams[b])
+        if common / len(grams[a] | grams[b]) >= name_similarity:
+            edges.append((a, b, "similar_name"))
+
+    groups = UnionFind(len(contacts))
+    for a, b, _ in edges:
+        groups.union(a, b)
+    members, reasons = defaultdict(list), defaultdict(set)
+    for index in range(len(contacts)):
+        members[groups.find(index)].append(contacts[index])
+    for a, _, reason in edges:
+        reasons[groups.find(a)].add(reason)
+    return [(group, sorted(reasons[root])) for root, group in members.items() if len(group) > 1]
+
+
+def dump_groups(contacts: List[Contact], name_similarity: float) -> bytes:
+    groups = find_duplicate_groups(sorted(contacts, key=lambda c: c.id), name_similarity)
+    return json.dumps({
+        "computed_at": datetime.now(timezone.utc).isoformat(),
+        "groups": [{"reasons": reasons,
+                    "contacts": [ContactsResponse.model_validate(c).model_dump(mode="json") for c in group]}
+                   for group, reasons in groups],
+    }).encode()
+
+
+class DuplicateFinder:
+    def __init__(self, client: redis.Redis, ttl: int, name_similarity: float) -> None:
+        self._redis = client
+        self._ttl = ttl
+        self._name_similarity = name_similarity
+
+    @staticmethod
+    def _key(user_id: int) -> str:
+        return f"duplicates:{user_id}"
+
+    @staticmethod
+    def _generation_key(user_id: int) -> str:
+        return f"duplicates:gen:{user_id}"
+
+    async def generation(self) -> int:
+        # Same scheme as the birthday digest: read before loading contacts,
+        # and a merge or edit in between stamps the user with a later value.
+        return int(await self._redis.get(CLOCK_KEY) or 0)
+
+    async def get(self, user_id: int) -> Optional[bytes]:
+        return await self._redis.get(self._key(user_id))
+
+    async def store(self, user_id: int, contacts: Iterable[Contact], generation: int) -> bytes:
+        # Grouping and serializing a large address book is CPU bound; in a
+        # thread it cannot hold up the requests on this event loop.
+        content = await asyncio.to_thread(dump_groups, list(contacts), self._name_similarity)
+        # Groups built from rows read before the last invalidation may point
+        # at merged or deleted contacts; they are returned but not kept.
+        generation_key = self._generation_key(user_id)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(generation_key)
+                if int(await pipe.get(generation_key) or 0) > generation:
+                    return content
+                pipe.multi()
+                pipe.set(self._key(user_id), content, ex=self._ttl)
+                await pipe.execute()
+            except WatchError:
+                pass
+        return content
+
+    async def invalidate(self, user_id: int):
+        generation = await self._redis.incr(CLOCK_KEY)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.set(self._generation_key(user_id), generation, ex=self._ttl)
+            pipe.delete(self._key(user_id))
+            await pipe.execute()
+
+    async def refresh_all(self, sessions: Callable[[], AsyncContextManager[AsyncSession]], page_size: int = 500):
+        # Short sessions for each page of owners and each user, so no
+        # transaction stays open while the whole table is walked.
+        last_user_id = 0
+        while True:
+            async with sessions() as session:
+                stmt = (select(Contact.user_id).where(Contact.user_id > last_user_id)
+                        .group_by(Contact.user_id).order_by(Contact.user_id).limit(page_size))
+                owners = (await session.scalars(stmt)).all()
+            if not owners:
+                return
+            for user_id in owners:
+                generation = await self.generation()
+                async with sessions() as session:
+                    contacts = (await session.scalars(select(Contact).where(Contact.user_id == user_id))).all()
+                await self.store(user_id, contacts, generation)
+            last_user_id = owners[-1]
+
+
+duplicate_finder = DuplicateFinder(redis_client, ttl=settings.duplicates_ttl,
+                                   name_similarity=settings.duplicates_name_similarity)
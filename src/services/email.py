@@ -1,51 +1,27 @@
-from pathlib import Path
-
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from fastapi_mail.errors import ConnectionErrors
 from pydantic import EmailStr
 
-from src.config.config import settings
 from src.services.auth import auth_service
-
-conf = ConnectionConfig(
-    MAIL_USERNAME=settings.mail_username,
-    MAIL_PASSWORD=settings.mail_password,
-    MAIL_FROM=settings.mail_from,
-    MAIL_PORT=settings.mail_port,
-    MAIL_SERVER=settings.mail_server,
-    MAIL_FROM_NAME=settings.mail_from_name,
-    MAIL_STARTTLS=settings.mail_starttls,
-    MAIL_SSL_TLS=settings.mail_ssl_tls,
-    USE_CREDENTIALS=settings.use_credentials,
-    VALIDATE_CERTS=settings.validate_serts,
-    TEMPLATE_FOLDER=Path(__file__).parent / 'templates',
-)
+from src.services.mail_queue import email_queue
 
 
 async def send_email(email: EmailStr, username: str, host: str):
-    try:
-        token_verification = auth_service.create_email_token({"sub": email})
-        message = MessageSchema(
-            subject="Confirm your email ",
-            recipients=[email],
-            template_body={"host": host, "username": username, "token": token_verification},
-            subtype=MessageType.html
-        )
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name="verify_email_template.html")
-    except ConnectionErrors as err:
-        print(err)
+    token_verification = auth_service.create_email_token({"sub": email})
+    await email_queue.enqueue(template_name="verify_email_template.html",
+                              subject="Confirm your email ",
+                              recipients=[email],
+                              template_body={"host": host, "username": username, "token": token_verification})
+
 
 async def send_reset_password_email(email: str,  username: str, host: str):
-    try:
-        reset_token = await auth_service.create_reset_password_token({"sub": email})
-        message = MessageSchema(
-            subject="Reset Password",
-            recipients=[email], #f"Click the link to reset your password: {base_url}api/auth/reset_password?token={reset_token}"
-            template_body={"host": host, "username": username, "token":reset_token},
-            subtype=MessageType.html
-        )
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name="reset_password_email_template.html")
-    except ConnectionErrors as err:
-        print(err)
\ No newline at end of file
+    reset_token = await auth_service.create_reset_password_token({"sub": email})
+    await email_queue.enqueue(template_name="reset_password_email_template.html",
+                              subject="Reset Password",
+                              recipients=[email],
+                              template_body={"host": host, "username": username, "token": reset_token})
+
+
+async def send_birthday_digest(email: str, username: str, contacts: list[dict], days: int):
+    await email_queue.enqueue(template_name="birthday_digest_template.html",
+                              subject="Upcoming birthdays",
+                              recipients=[email],
+                              template_body={"username": username, "contacts": contacts, "days": days})
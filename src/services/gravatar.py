@@ -0,0 +1,18 @@
+from functools import lru_cache
+
+from src.repository.users import UserDB
+from src.services.auth import auth_service
+from src.services.cache import invalidate_user_contacts
+
+
+@lru_cache(maxsize=10_000)
+def gravatar_url(email: str) -> str:
+    from libgravatar import Gravatar
+
+    return Gravatar(email).get_image()
+
+
+async def resolve_avatar(user_db: UserDB, user_id: int, email: str):
+    await user_db.set_default_avatar(user_id, gravatar_url(email))
+    await auth_service.cach.delete(email)
+    await invalidate_user_contacts(user_id)
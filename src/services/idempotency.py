@@ -0,0 +1,104 @@
+import hashlib
+import json
+from typing import Optional
+
+import redis.asyncio as redis
+from fastapi import Depends, Header, HTTPException, Request, Response, status
+
+from src.config.config import settings
+from src.database.models import User
+from src.database.redis_client import redis_client
+from src.services.auth import auth_service
+
+
+class IdempotentReplay(Exception):
+    # Raised from the dependency so a retry is answered before the rate
+    # limiter and the route run; main.py turns it into the stored response.
+    def __init__(self, response: Response) -> None:
+        self.response = response
+
+
+class IdempotentRequest:
+    def __init__(self, store: "IdempotencyStore", key: Optional[str], fingerprint: Optional[str]) -> None:
+        self._store = store
+        self._key = key
+        self._fingerprint = fingerprint
+        self.completed = False
+
+    async def respond(self, content: str | bytes, status_code: int = status.HTTP_200_OK) -> Response:
+        if self._key is not None:
+            await self._store.complete(self._key, self._fingerprint, status_code, content)
+        self.completed = True
+        return Response(content=content, status_code=status_code, media_type="application/json")
+
+    async def release(self):
+        if self._key is not None and not self.completed:
+            await self._store.release(self._key)
+
+
+class IdempotencyStore:
+    def __init__(self, client: redis.Redis, ttl: int, lock_timeout: int) -> None:
+        self._redis = client
+        self._ttl = ttl
+        self._lock_timeout = lock_timeout
+
+    @staticmethod
+    def _key(user_id: int, idempotency_key: str) -> str:
+        return f"idempotency:{user_id}:{idempotency_key}"
+
+    @staticmethod
+    async def fingerprint(request: Request) -> str:
+        digest = hashlib.sha256(f"{request.method} {request.url.path}\n".encode())
+        digest.update(await request.body())
+        return digest.hexdigest()
+
+    async def begin(self, key: str, fingerprint: str) -> Optional[dict]:
+        # The in-progress marker doubles as the lock: the first request sets
+        # it, concurrent duplicates find it. It expires on its own if the
+        # worker dies mid-request.
+        marker = json.dumps({"fingerprint": fingerprint})
+        if await self._redis.set(key, marker, nx=True, ex=self._lock_timeout):
+            return None
+        stored = await self._redis.get(key)
+        if stored is None:
+            return await self.begin(key, fingerprint)
+        return json.loads(stored)
+
+    async def complete(self, key: str, fingerprint: str, status_code: int, content: str | bytes):
+        if isinstance(content, bytes):
+            content = content.decode()
+        await self._redis.set(key, json.dumps({"fingerprint": fingerprint, "status_code": status_code,
+                                               "body": content}), ex=self._ttl)
+
+    async def release(self, key: str):
+        # Failed requests are not remembered, so the client can retry them.
+        await self._redis.delete(key)
+
+    async def __call__(self, request: Request,
+                       idempotency_key: Optional[str] = Header(None, min_length=1, max_length=255),
+                       user: User = Depends(auth_service.get_current_user)):
+        if idempotency_key is None:
+            yield IdempotentRequest(self, None, None)
+            return
+        key = self._key(user.id, idempotency_key)
+        fingerprint = await self.fingerprint(request)
+        stored = await self.begin(key, fingerprint)
+        if stored is not None:
+            if stored["fingerprint"] != fingerprint:
+                raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                                    detail="Idempotency-Key was already used for a different request")
+            if "status_code" not in stored:
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                                    detail="A request with this Idempotency-Key is still in progress")
+            raise IdempotentReplay(Response(content=stored["body"], status_code=stored["status_code"],
+                                            media_type="application/json",
+                                            headers={"Idempotent-Replayed": "true"}))
+        handle = IdempotentRequest(self, key, fingerprint)
+        try:
+            yield handle
+        finally:
+            await handle.release()
+
+
+idempotency = IdempotencyStore(redis_client, ttl=settings.idempotency_ttl,
+                               lock_timeout=settings.idempotency_lock_timeout)
@@ -0,0 +1,33 @@
+# Runs the batch jobs that walk every user's contacts.
+#
+#   python -m src.services.job_worker
+#
+# These jobs used to run inside the web workers, where their work competed
+# with requests on the same event loop. Any number of job workers can run;
+# the scheduler's Redis lock lets one of them take each period.
+import asyncio
+
+from src.config.config import settings
+from src.config.logging_config import setup_logging
+from src.database.connect import database
+from src.database.redis_client import redis_client
+from src.services.jobs import find_duplicates, refresh_birthday_digest
+from src.services.scheduler import run_periodically
+from src.services.tracing import setup_tracing
+
+
+async def main():
+    setup_logging()
+    setup_tracing(f"{settings.tracing_service_name}-job-worker")
+    try:
+        await asyncio.gather(
+            run_periodically(redis_client, "birthday_digest", 24 * 60 * 60, refresh_birthday_digest),
+            run_periodically(redis_client, "duplicates", 24 * 60 * 60, find_duplicates),
+        )
+    finally:
+        await database.dispose()
+        await redis_client.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
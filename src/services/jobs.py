@@ -0,0 +1,42 @@
+import json
+import logging
+
+from src.config.config import settings
+from src.database.connect import database
+from src.database.models import User
+from src.repository.stats import VIEWS, StatsDB
+from src.services.account_deletion import account_deletion
+from src.services.birthdays import birthday_digest
+from src.services.duplicates import duplicate_finder
+from src.services.email import send_birthday_digest
+
+logger = logging.getLogger(__name__)
+
+
+async def email_birthday_digest(user: User, upcoming: list[bytes]):
+    contacts = [json.loads(member) for member in upcoming]
+    await send_birthday_digest(user.email, user.username, contacts, settings.birthday_digest_days)
+
+
+async def refresh_birthday_digest():
+    on_user = email_birthday_digest if settings.birthday_digest_email else None
+    await birthday_digest.refresh_all(database.get_session, on_user=on_user)
+
+
+async def find_duplicates():
+    await duplicate_finder.refresh_all(database.get_session)
+
+
+async def refresh_stats_views():
+    # One transaction per view, so a failing view does not hold back the others.
+    for view in VIEWS:
+        try:
+            async with database.get_session() as session:
+                duration_ms = await StatsDB(session).refresh(view)
+            logger.info("Materialized view refreshed", extra={"view": view, "duration_ms": round(duration_ms, 1)})
+        except Exception:
+            logger.exception("Materialized view refresh failed", extra={"view": view})
+
+
+async def resume_account_deletions():
+    await account_deletion.resume()
@@ -0,0 +1,85 @@
+import json
+import time
+from typing import List
+
+import redis.asyncio as redis
+from opentelemetry import propagate
+
+from src.config.config import settings
+from src.database.redis_client import redis_client
+
+
+class EmailQueue:
+    # Messages wait in a Redis list. A worker moves them atomically into
+    # its own processing list and removes them only once sent, so nothing
+    # is lost if the worker dies mid-batch. Failed messages are retried
+    # with backoff from a sorted set and end up in a dead-letter list.
+    queue_key = "mail:queue"
+    retry_key = "mail:retry"
+    dead_key = "mail:dead"
+
+    def __init__(self, client: redis.Redis, max_attempts: int) -> None:
+        self._redis = client
+        self._max_attempts = max_attempts
+
+    @staticmethod
+    def _processing_key(consumer: str) -> str:
+        return f"mail:processing:{consumer}"
+
+    async def enqueue(self, template_name: str, subject: str, recipients: List[str], template_body: dict):
+        message = {"template_name": template_name, "subject": subject, "recipients": recipients,
+                   "template_body": template_body, "attempts": 0, "trace": {}}
+        # Carries the caller's trace context so the worker's send span joins it.
+        propagate.inject(message["trace"])
+        await self._redis.lpush(self.queue_key, json.dumps(message))
+
+    async def reserve(self, consumer: str, batch_size: int, timeout: int = 5) -> List[bytes]:
+        processing = self._processing_key(consumer)
+        first = await self._redis.blmove(self.queue_key, processing, timeout, "RIGHT", "LEFT")
+        if first is None:
+            return []
+        batch = [first]
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for _ in range(batch_size - 1):
+                pipe.lmove(self.queue_key, processing, "RIGHT", "LEFT")
+            batch.extend(raw for raw in await pipe.execute() if raw is not None)
+        return batch
+
+    async def ack(self, consumer: str, raw: bytes):
+        await self._redis.lrem(self._processing_key(consumer), 1, raw)
+
+    async def retry(self, consumer: str, raw: bytes):
+        message = json.loads(raw)
+        message["attempts"] += 1
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.lrem(self._processing_key(consumer), 1, raw)
+            if message["attempts"] >= self._max_attempts:
+                pipe.lpush(self.dead_key, json.dumps(message))
+            else:
+                backoff = 2 ** message["attempts"]
+                pipe.zadd(self.retry_key, {json.dumps(message): time.time() + backoff})
+            await pipe.execute()
+
+    async def promote_due(self):
+        due = await self._redis.zrangebyscore(self.retry_key, 0, time.time())
+        for raw in due:
+            # ZREM wins only for one worker, so a retry is requeued once.
+            if await self._redis.zrem(self.retry_key, raw):
+                await self._redis.lpush(self.queue_key, raw)
+
+    async def recover(self, consumer: str):
+        # Requeue whatever this consumer held when it last stopped.
+        processing = self._processing_key(consumer)
+        while await self._redis.lmove(processing, self.queue_key, "RIGHT", "RIGHT") is not None:
+            pass
+
+    async def depth(self) -> dict:
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.llen(self.queue_key)
+            pipe.zcard(self.retry_key)
+            pipe.llen(self.dead_key)
+            queued, retrying, dead = await pipe.execute()
+        return {"queued": queued, "retrying": retrying, "dead": dead}
+
+
+email_queue = EmailQueue(redis_client, max_attempts=settings.mail_max_attempts)
@@ -0,0 +1,43 @@
+import asyncio
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, select_autoescape
+
+from src.config.config import settings
+
+TEMPLATE_FOLDER = Path(__file__).parent / 'templates'
+
+
+class MailTemplates:
+    def __init__(self, folder: Path, cache_dir: str, workers: int) -> None:
+        os.makedirs(cache_dir, exist_ok=True)
+        # auto_reload=False keeps compiled templates without stat()ing the
+        # files on each render; the bytecode cache lets a fresh process skip
+        # the Jinja compile step entirely.
+        self._env = Environment(loader=FileSystemLoader(folder),
+                                autoescape=select_autoescape(["html"]),
+                                auto_reload=False,
+                                bytecode_cache=FileSystemBytecodeCache(cache_dir))
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mail-render")
+
+    def preload(self) -> list[str]:
+        names = self._env.list_templates(extensions=["html"])
+        for name in names:
+            self._env.get_template(name)
+        return names
+
+    def render_sync(self, template_name: str, context: dict) -> str:
+        return self._env.get_template(template_name).render(**context)
+
+    async def render(self, template_name: str, context: dict) -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.render_sync, template_name, context)
+
+
+mail_templates = MailTemplates(TEMPLATE_FOLDER,
+                               cache_dir=settings.mail_template_cache_dir or os.path.join(tempfile.gettempdir(),
+                                                                                          "mail-templates"),
+                               workers=settings.mail_render_workers)
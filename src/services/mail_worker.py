@@ -0,0 +1,131 @@
+# Drains the outbound email queue over a single reused SMTP connection.
+#
+#   python -m src.services.mail_worker [--consumer NAME]
+#   python -m src.services.mail_worker --depth
+#
+# For local testing point MAIL_SERVER/MAIL_PORT at an SMTP sink, e.g.
+# `python -m aiosmtpd -n -l localhost:8025` (from requirements-dev.txt) with
+# MAIL_SSL_TLS=false and USE_CREDENTIALS=false.
+import argparse
+import asyncio
+import json
+import logging
+import socket
+from email.message import EmailMessage
+from email.utils import formataddr
+
+import aiosmtplib
+from jinja2 import TemplateError
+from opentelemetry import propagate
+
+from src.config.config import settings
+from src.config.logging_config import setup_logging
+from src.services.mail_queue import EmailQueue, email_queue
+from src.services.mail_templates import MailTemplates, mail_templates
+from src.services.tracing import setup_tracing, tracer
+
+logger = logging.getLogger(__name__)
+
+
+class MailWorker:
+    def __init__(self, queue: EmailQueue, templates: MailTemplates, consumer: str, batch_size: int,
+                 rate_limit: float) -> None:
+        self._queue = queue
+        self._templates = templates
+        self._consumer = consumer
+        self._batch_size = batch_size
+        self._interval = 1 / rate_limit if rate_limit > 0 else 0
+        self._smtp: aiosmtplib.SMTP | None = None
+
+    async def _connection(self) -> aiosmtplib.SMTP:
+        if self._smtp is None or not self._smtp.is_connected:
+            self._smtp = aiosmtplib.SMTP(hostname=settings.mail_server,
+                                         port=settings.mail_port,
+                                         use_tls=settings.mail_ssl_tls,
+                                         start_tls=settings.mail_starttls,
+                                         validate_certs=settings.validate_serts)
+            with tracer.start_as_current_span("smtp.connect"):
+                await self._smtp.connect()
+                if settings.use_credentials:
+                    await self._smtp.login(settings.mail_username, settings.mail_password)
+        return self._smtp
+
+    async def _disconnect(self):
+        if self._smtp is not None and self._smtp.is_connected:
+            try:
+                await self._smtp.quit()
+            except aiosmtplib.SMTPException:
+                self._smtp.close()
+        self._smtp = None
+
+    async def build_message(self, payload: dict) -> EmailMessage:
+        html = await self._templates.render(payload["template_name"], payload["template_body"])
+        message = EmailMessage()
+        message["From"] = formataddr((settings.mail_from_name, settings.mail_from))
+        message["To"] = ", ".join(payload["recipients"])
+        message["Subject"] = payload["subject"]
+        message.set_content(html, subtype="html")
+        return message
+
+    async def process_batch(self) -> int:
+        await self._queue.promote_due()
+        batch = await self._queue.reserve(self._consumer, self._batch_size)
+        loop = asyncio.get_running_loop()
+        for raw in batch:
+            started = loop.time()
+            payload = json.loads(raw)
+            try:
+                message = await self.build_message(payload)
+            except TemplateError as err:
+                logger.error("Email rendering failed", extra={"template": payload["template_name"], "error": str(err)})
+                await self._queue.retry(self._consumer, raw)
+                continue
+            try:
+                with tracer.start_as_current_span("smtp.send", context=propagate.extract(payload.get("trace", {})),
+                                                  attributes={"mail.template": payload["template_name"]}):
+                    smtp = await self._connection()
+                    await smtp.send_message(message)
+            except (aiosmtplib.SMTPException, OSError) as err:
+                logger.warning("Email delivery failed", extra={"error": str(err)})
+                await self._disconnect()
+                await self._queue.retry(self._consumer, raw)
+            else:
+                await self._queue.ack(self._consumer, raw)
+            delay = self._interval - (loop.time() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        return len(batch)
+
+    async def run(self):
+        self._templates.preload()
+        await self._queue.recover(self._consumer)
+        try:
+            while True:
+                sent = await self.process_batch()
+                if sent:
+                    logger.info("Processed emails", extra={"sent": sent, "queue": await self._queue.depth()})
+                elif self._smtp is not None:
+                    # Idle: release the connection instead of letting the
+                    # server time it out.
+                    await self._disconnect()
+        finally:
+            await self._disconnect()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Outbound email worker")
+    parser.add_argument("--consumer", default=socket.gethostname())
+    parser.add_argument("--depth", action="store_true", help="print queue depth and exit")
+    args = parser.parse_args()
+    if args.depth:
+        print(json.dumps(await email_queue.depth()))
+        return
+    setup_logging()
+    setup_tracing(f"{settings.tracing_service_name}-mail-worker")
+    worker = MailWorker(email_queue, mail_templates, args.consumer, settings.mail_batch_size,
+                        settings.mail_rate_limit)
+    await worker.run()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+import os
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, \
+    generate_latest, multiprocess
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+# With PROMETHEUS_MULTIPROC_DIR set (and emptied before start) every uvicorn
+# worker writes its samples to mmap'ed files there, and /metrics merges them.
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency",
+                            ["method", "route", "status"])
+REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being served",
+                           multiprocess_mode="livesum")
+DB_QUERIES = Counter("db_queries_total", "SQL statements executed", ["operation"])
+DB_QUERY_DURATION = Histogram("db_query_duration_seconds", "SQL statement duration", ["operation"],
+                              buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5))
+DB_READS = Counter("db_reads_total", "Repository reads by target database", ["target", "reason"])
+DB_POOL_WAIT = Histogram("db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection",
+                         buckets=(.0001, .0005, .001, .005, .01, .05, .1, .5, 1, 5))
+REDIS_LATENCY = Histogram("redis_command_duration_seconds", "Redis command latency", ["client", "command"],
+                          buckets=(.0001, .0005, .001, .0025, .005, .01, .025, .05, .1, .5))
+RATE_LIMITED = Counter("rate_limiter_rejections_total", "Requests rejected by the rate limiter", ["route"])
+EMAIL_QUEUE_DEPTH = Gauge("email_queue_depth", "Outbound emails by state", ["state"],
+                          multiprocess_mode="mostrecent")
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    # _do_get is where the pool blocks when every connection is checked out.
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - started)
+
+
+def instrument_engine(engine: AsyncEngine):
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._query_started = time.perf_counter()
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        operation = statement.lstrip().split(" ", 1)[0].lower()
+        DB_QUERIES.labels(operation=operation).inc()
+        DB_QUERY_DURATION.labels(operation=operation).observe(time.perf_counter() - context._query_started)
+
+
+def observe_redis(client: str, command: str, started: float):
+    REDIS_LATENCY.labels(client=client, command=command.lower()).observe(time.perf_counter() - started)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int):
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(pid)
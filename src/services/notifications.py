@@ -0,0 +1,43 @@
+import json
+from typing import AsyncIterator
+
+import redis.asyncio as redis
+
+from src.database.models import Contact
+from src.database.redis_client import redis_client
+from src.schemas.contacts import ContactsResponse
+
+
+class ContactEvents:
+    created = "created"
+    updated = "updated"
+    deleted = "deleted"
+
+    def __init__(self, client: redis.Redis) -> None:
+        self._redis = client
+
+    @staticmethod
+    def _channel(user_id: int) -> str:
+        return f"contacts:events:{user_id}"
+
+    async def publish(self, user_id: int, event: str, contact: Contact | None = None, contact_id: int | None = None):
+        payload = {"event": event, "contact_id": contact.id if contact is not None else contact_id}
+        if contact is not None:
+            payload["contact"] = ContactsResponse.model_validate(contact).model_dump(mode="json")
+        await self._redis.publish(self._channel(user_id), json.dumps(payload))
+
+    async def subscribe(self, user_id: int) -> AsyncIterator[str]:
+        # Each subscriber holds its own pub/sub connection, so every worker
+        # receives events published by any other worker for this user.
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(self._channel(user_id))
+        try:
+            async for message in pubsub.listen():
+                data = message["data"]
+                yield data.decode() if isinstance(data, bytes) else data
+        finally:
+            await pubsub.unsubscribe(self._channel(user_id))
+            await pubsub.aclose()
+
+
+contact_events = ContactEvents(redis_client)
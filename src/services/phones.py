@@ -0,0 +1,19 @@
+from functools import lru_cache
+from typing import Optional
+
+import phonenumbers
+
+from src.config.config import settings
+
+
+@lru_cache(maxsize=4096)
+def to_e164(phone: str, region: str = settings.phone_default_region) -> Optional[str]:
+    # Numbers without a country code are read as local to the default region;
+    # anything that still cannot be a real number stays unindexed.
+    try:
+        number = phonenumbers.parse(phone, region)
+    except phonenumbers.NumberParseException:
+        return None
+    if not phonenumbers.is_possible_number(number):
+        return None
+    return phonenumbers.format_number(number, phonenumbers.PhoneNumberFormat.E164)
@@ -0,0 +1,78 @@
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from src.config.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RequestQueries:
+    count: int = 0
+    elapsed: float = 0.0
+    statements: Counter = field(default_factory=Counter)
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        return [(statement, count) for statement, count in self.statements.most_common() if count >= threshold]
+
+
+current_queries: ContextVar[RequestQueries | None] = ContextVar("current_queries", default=None)
+
+
+def explain(connection, statement: str, parameters) -> str:
+    # A separate DBAPI cursor, so the rows of the original statement are
+    # left untouched; raw cursors do not fire engine events either.
+    cursor = connection.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute(f"EXPLAIN {statement}", parameters)
+        return "\n".join(row[0] for row in cursor.fetchall())
+    finally:
+        cursor.close()
+
+
+def inspect_engine(engine: AsyncEngine):
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._inspect_started = time.perf_counter()
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        queries = current_queries.get()
+        if queries is None:
+            return
+        elapsed = time.perf_counter() - context._inspect_started
+        queries.count += 1
+        queries.elapsed += elapsed
+        queries.statements[statement] += 1
+        if elapsed * 1000 >= settings.db_slow_query_ms:
+            plan = None
+            if statement.lstrip().upper().startswith("SELECT"):
+                try:
+                    plan = explain(conn, statement, parameters)
+                except Exception as err:
+                    plan = f"EXPLAIN failed: {err}"
+            logger.warning("Slow query", extra={"elapsed_ms": round(elapsed * 1000, 2), "statement": statement,
+                                                "parameter_types": parameter_types(parameters), "plan": plan})
+
+
+def parameter_types(parameters) -> list[str]:
+    # Values can be password hashes or tokens, so only their types are logged.
+    if isinstance(parameters, dict):
+        parameters = parameters.values()
+    return [type(value).__name__ for value in parameters or ()]
+
+
+def report(method: str, path: str, queries: RequestQueries) -> dict[str, str]:
+    repeated = queries.repeated(settings.db_repeated_query_threshold)
+    for statement, count in repeated:
+        logger.warning("Possible N+1", extra={"method": method, "path": path, "count": count,
+                                              "statement": statement})
+    return {"X-DB-Queries": str(queries.count),
+            "X-DB-Time": f"{queries.elapsed * 1000:.2f}",
+            "X-DB-Repeated": str(len(repeated))}
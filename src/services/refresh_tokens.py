@@ -0,0 +1,132 @@
+import uuid
+
+import redis.asyncio as redis
+
+from src.config.config import settings
+from src.database.redis_client import redis_client
+
+# Issuing into a family and revoking it must not interleave: a revoke landing
+# between a refresh's checks and its writes would be undone by the new token.
+ISSUE_SCRIPT = """
+if redis.call('EXISTS', KEYS[4]) == 1 then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'email', ARGV[1], 'family', ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('SADD', KEYS[2], ARGV[4])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+redis.call('SADD', KEYS[3], ARGV[2])
+redis.call('EXPIRE', KEYS[3], ARGV[3])
+return 1
+"""
+
+# Spending a token is one step: ownership check, delete, the used marker and
+# leaving the family. A replay can then never slip in between the delete and
+# the marker and be taken for an unknown token instead of a reuse.
+# ARGV[3] is the family key prefix; the family is only known from the token.
+ROTATE_SCRIPT = """
+local token = redis.call('HGETALL', KEYS[1])
+if #token == 0 then
+    local family = redis.call('GET', KEYS[2])
+    if family then
+        return {'reused', family}
+    end
+    return {'unknown'}
+end
+local fields = {}
+for i = 1, #token, 2 do
+    fields[token[i]] = token[i + 1]
+end
+if fields['email'] ~= ARGV[1] then
+    return {'foreign'}
+end
+redis.call('DEL', KEYS[1])
+redis.call('SET', KEYS[2], fields['family'], 'EX', ARGV[2])
+redis.call('SREM', ARGV[3] .. fields['family'], ARGV[4])
+return {'ok', fields['family']}
+"""
+
+
+class RefreshTokenError(Exception):
+    pass
+
+
+class RefreshTokenReused(RefreshTokenError):
+    pass
+
+
+class RefreshTokenStore:
+    # Every login starts a token family (one per device). Refreshing spends
+    # the presented token id and issues the next one in the same family.
+    # Presenting an already spent id means the token leaked, so the whole
+    # family is revoked.
+    def __init__(self, client: redis.Redis, ttl: int) -> None:
+        self._redis = client
+        self._ttl = ttl
+        self._issue = client.register_script(ISSUE_SCRIPT)
+        self._rotate = client.register_script(ROTATE_SCRIPT)
+
+    @staticmethod
+    def _token_key(jti: str) -> str:
+        return f"rt:token:{jti}"
+
+    @staticmethod
+    def _used_key(jti: str) -> str:
+        return f"rt:used:{jti}"
+
+    @staticmethod
+    def _family_key(family: str) -> str:
+        return f"rt:family:{family}"
+
+    @staticmethod
+    def _revoked_key(family: str) -> str:
+        return f"rt:revoked:{family}"
+
+    @staticmethod
+    def _user_key(email: str) -> str:
+        return f"rt:user:{email}"
+
+    async def issue(self, email: str, family: str | None = None) -> tuple[str, str]:
+        jti = uuid.uuid4().hex
+        family = family or uuid.uuid4().hex
+        keys = [self._token_key(jti), self._family_key(family), self._user_key(email), self._revoked_key(family)]
+        if not await self._issue(keys=keys, args=[email, family, self._ttl, jti]):
+            raise RefreshTokenError("Token family was revoked")
+        return jti, family
+
+    async def rotate(self, jti: str | None, email: str) -> str:
+        if not jti:
+            raise RefreshTokenError("Token has no id")
+        result = await self._rotate(keys=[self._token_key(jti), self._used_key(jti)],
+                                    args=[email, self._ttl, self._family_key(""), jti])
+        outcome = result[0].decode()
+        if outcome == "ok":
+            return result[1].decode()
+        if outcome == "reused":
+            await self.revoke_family(result[1].decode())
+            raise RefreshTokenReused("Refresh token reuse detected")
+        if outcome == "foreign":
+            raise RefreshTokenError("Token does not belong to this user")
+        raise RefreshTokenError("Unknown refresh token")
+
+    async def revoke_family(self, family: str):
+        # The marker goes first: from then on no token can join the family.
+        await self._redis.set(self._revoked_key(family), 1, ex=self._ttl)
+        jtis = await self._redis.smembers(self._family_key(family))
+        await self._redis.delete(self._family_key(family), *(self._token_key(jti.decode()) for jti in jtis))
+
+    async def revoke(self, jti: str | None):
+        if not jti:
+            return
+        token = await self._redis.hgetall(self._token_key(jti))
+        if token:
+            await self.revoke_family(token[b"family"].decode())
+
+    async def revoke_user(self, email: str):
+        families = await self._redis.smembers(self._user_key(email))
+        for family in families:
+            await self.revoke_family(family.decode())
+        await self._redis.delete(self._user_key(email))
+
+
+refresh_tokens = RefreshTokenStore(redis_client, ttl=settings.refresh_token_ttl)
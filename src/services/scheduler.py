@@ -0,0 +1,23 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable
+
+import redis.asyncio as redis
+
+logger = logging.getLogger(__name__)
+
+
+async def run_periodically(client: redis.Redis, name: str, period: int, job: Callable[[], Awaitable[None]],
+                           check_interval: int = 60):
+    # Every worker runs this loop; a Redis lock per period bucket makes sure
+    # only one of them executes the job in each period.
+    while True:
+        bucket = int(time.time() // period)
+        acquired = await client.set(f"scheduler:{name}:{bucket}", 1, nx=True, ex=period * 2)
+        if acquired:
+            try:
+                await job()
+            except Exception:
+                logger.exception("Scheduled job failed", extra={"job": name})
+        await asyncio.sleep(check_interval)
@@ -0,0 +1,31 @@
+import logging
+import time
+from typing import Awaitable
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    def __init__(self, started: float) -> None:
+        self._started = started
+        self.phases: dict[str, float] = {}
+
+    def mark(self, phase: str, since: float):
+        self.phases[phase] = round((time.perf_counter() - since) * 1000, 1)
+
+    async def timed(self, phase: str, awaitable: Awaitable, required: bool = True):
+        # Warm-ups that are not required only cost the first requests a
+        # handshake when they fail, so they must not keep the worker down.
+        started = time.perf_counter()
+        try:
+            return await awaitable
+        except Exception:
+            if required:
+                raise
+            logger.warning("Startup step failed", extra={"phase": phase}, exc_info=True)
+        finally:
+            self.mark(phase, started)
+
+    def report(self):
+        self.mark("total", self._started)
+        logger.info("startup", extra={"phases_ms": self.phases})
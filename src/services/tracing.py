@@ -0,0 +1,60 @@
+import os
+
+from opentelemetry import trace
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from src.config.config import settings
+
+tracer = trace.get_tracer("contacts")
+_configured = False
+
+
+# The SDK and instrumentations are imported only when tracing is enabled;
+# with it off they would only slow down worker startup.
+def _exporter():
+    from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+    if settings.tracing_otlp_endpoint:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+        return OTLPSpanExporter(endpoint=settings.tracing_otlp_endpoint)
+    # One JSON span per line, appended to a local file.
+    return ConsoleSpanExporter(out=open(settings.tracing_file, "a"),
+                               formatter=lambda span: span.to_json(indent=None) + os.linesep)
+
+
+def setup_tracing(service_name: str):
+    global _configured
+    if not settings.tracing_enabled or _configured:
+        return
+    from opentelemetry.instrumentation.redis import RedisInstrumentor
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+    # ParentBased keeps a whole trace together: the ratio only decides at the
+    # root span, children follow the parent's decision.
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}),
+                              sampler=ParentBased(TraceIdRatioBased(settings.tracing_sample_ratio)))
+    provider.add_span_processor(BatchSpanProcessor(_exporter()))
+    trace.set_tracer_provider(provider)
+    # Patches the redis client classes, covering the shared async client and
+    # the one FastAPILimiter uses.
+    RedisInstrumentor().instrument()
+    _configured = True
+
+
+def trace_app(app):
+    if settings.tracing_enabled:
+        from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+
+        setup_tracing(settings.tracing_service_name)
+        FastAPIInstrumentor.instrument_app(app, excluded_urls="metrics")
+
+
+def trace_engine(engine: AsyncEngine):
+    if settings.tracing_enabled:
+        from opentelemetry.instrumentation.sqlalchemy import SQLAlchemyInstrumentor
+
+        SQLAlchemyInstrumentor().instrument(engine=engine.sync_engine)